@@ -0,0 +1,62 @@
+'''
+Benchmark reading ARF reports against parsing them whole.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_arf.py [--rules 2000] [--ovalsize 500000]
+
+A synthetic ARF report made mostly of OVAL system characteristics is written
+to a temporary file. It is read with ckl.readarf() and, for comparison, parsed
+with ElementTree.parse(). Time and the peak of traced Python memory are
+reported for both.
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def measure(function, filename):
+    '''Return (seconds, peak bytes) for calling function with filename.'''
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = function(filename)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del value
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rules', type=int, default=2000,
+                        help='number of rules in the benchmark')
+    parser.add_argument('--ovalsize', type=int, default=500000,
+                        help='number of OVAL system characteristics items')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = synth.writefile(os.path.join(tmpdir, 'bench-arf.xml'),
+                                   synth.arf(args.rules, ovalsize=args.ovalsize))
+        size = os.path.getsize(filename)
+        print('input: %d rules, %.1f MiB' % (args.rules, size / 2**20))
+        print('%10s %10s %12s' % ('reader', 'load (s)', 'peak (MiB)'))
+        for name, function in (('readarf', ckl.readarf),
+                               ('parse', ElementTree.parse)):
+            elapsed, peak = measure(function, filename)
+            print('%10s %10.3f %12.1f' % (name, elapsed, peak / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+Benchmark writing and reading a checklist as ckl (XML) and cklb (JSON).
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_cklb.py [--stigs 5] [--rules 1000] [--repeat 3]
+
+A checklist of synthetic STIGs is written in each format, then read back
+with readchecklist(). The best write and read time of each format and the
+output size are reported, along with the cklb to ckl ratios.
+
+The cklb is then read back and written again, the run fails if a stig uuid
+does not match the stig_uuid of its rules or changed in the round trip.
+'''
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def best(function, repeat):
+    '''Return the best time of repeat calls to function.'''
+
+    times = []
+    for count in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def stiguuids(filename):
+    '''Return the stig uuids of a cklb, checking each rule's stig_uuid.'''
+
+    with open(filename, encoding='UTF-8') as f:
+        document = json.load(f)
+    uuids = []
+    for stig in document['stigs']:
+        for rule in stig['rules']:
+            assert rule['stig_uuid'] == stig['uuid'], \
+                stig['stig_id'] + ': rule stig_uuid does not match the stig uuid'
+        uuids.append(stig['uuid'])
+    return uuids
+
+
+def checkroundtrip(filename, tmpdir):
+    '''Check that a cklb keeps its stig uuids through readcklb() and write().'''
+
+    again = os.path.join(tmpdir, 'again.cklb')
+    ckl.readcklb(filename).write(again, fmt='cklb')
+    assert stiguuids(filename) == stiguuids(again), 'stig uuids changed'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=5,
+                        help='number of STIGs in the checklist')
+    parser.add_argument('--rules', type=int, default=1000,
+                        help='number of rules per STIG')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best time is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        checklist = ckl.Ckl()
+        for num in range(args.stigs):
+            source = io.StringIO(synth.benchmark(
+                args.rules, 'STIG_%d' % num, first=num * args.rules))
+            source.name = 'stig-%d-xccdf.xml' % num
+            checklist.importxccdf(ckl.Xccdf(source))
+        checklist.addtemplate(synth.writefile(
+            os.path.join(tmpdir, 'template.csv'),
+            synth.template(args.stigs * args.rules)))
+
+        print('%8s %10s %10s %12s' % ('format', 'write (s)', 'read (s)', 'size (KiB)'))
+        results = {}
+        for fmt in ckl.FORMATS:
+            filename = os.path.join(tmpdir, 'bench.' + fmt)
+            write = best(lambda: checklist.write(filename, fmt=fmt), args.repeat)
+            read = best(lambda: ckl.readchecklist(filename), args.repeat)
+            size = os.path.getsize(filename)
+            results[fmt] = (write, read, size)
+            print('%8s %10.3f %10.3f %12.1f' % (fmt, write, read, size / 1024))
+
+        ratios = [results['cklb'][index] / results['ckl'][index] for index in range(3)]
+        print('%8s %10.2f %10.2f %12.2f' % ('ratio', ratios[0], ratios[1], ratios[2]))
+
+        checkroundtrip(os.path.join(tmpdir, 'bench.cklb'), tmpdir)
+        print('round trip: stig uuids ok')
+
+
+if __name__ == '__main__':
+    main()
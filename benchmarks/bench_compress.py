@@ -0,0 +1,71 @@
+'''
+Benchmark writing a checklist with each output compression and level.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_compress.py [--stigs 5] [--rules 1000]
+
+A checklist of synthetic STIGs is written uncompressed, then with every
+available compression at a few levels. Write time and output size are
+reported, compression happens while the checklist is written so the write
+time includes it.
+'''
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+LEVELS = {'gzip': [1, 6, 9], 'xz': [0, 6], 'zstd': [1, 3, 19]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=5,
+                        help='number of STIGs in the checklist')
+    parser.add_argument('--rules', type=int, default=1000,
+                        help='number of rules per STIG')
+    args = parser.parse_args()
+
+    runs = [(None, None)]
+    for compression in sorted(ckl.COMPRESSIONS):
+        if compression == 'zstd' and ckl.zstd is None:
+            print('zstd: not available, skipped')
+            continue
+        runs.extend((compression, level) for level in LEVELS[compression])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        checklist = ckl.Ckl()
+        for num in range(args.stigs):
+            source = io.StringIO(synth.benchmark(
+                args.rules, 'STIG_%d' % num, first=num * args.rules))
+            source.name = 'stig-%d-xccdf.xml' % num
+            checklist.importxccdf(ckl.Xccdf(source))
+        checklist.addtemplate(synth.writefile(
+            os.path.join(tmpdir, 'template.csv'),
+            synth.template(args.stigs * args.rules)))
+
+        print('%12s %6s %10s %12s %8s' % ('compression', 'level', 'write (s)',
+                                          'size (KiB)', 'ratio'))
+        plain = None
+        for compression, level in runs:
+            filename = os.path.join(tmpdir, 'bench.ckl')
+            start = time.perf_counter()
+            checklist.write(filename, compression, level)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(filename)
+            plain = plain or size
+            print('%12s %6s %10.3f %12.1f %8.1f' % (compression or 'none',
+                                                    '-' if level is None else level,
+                                                    elapsed, size / 1024, plain / size))
+
+
+if __name__ == '__main__':
+    main()
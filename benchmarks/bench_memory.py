@@ -0,0 +1,64 @@
+'''
+Benchmark peak memory of Xccdf loading, with and without streaming.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_memory.py [--rules 2000] [--checksize 20000]
+
+A benchmark xccdf with large check-content blobs is written to a temporary
+file and loaded in both modes. Traced Python memory retained by the loaded
+Xccdf and the peak reached while loading are reported, the difference is the
+parsing overhead.
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def measure(filename, stream):
+    '''Return (seconds, retained bytes, peak bytes) for loading filename.'''
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    xccdf = ckl.Xccdf(filename, stream)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del xccdf
+    return elapsed, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rules', type=int, default=2000,
+                        help='number of rules in the benchmark')
+    parser.add_argument('--checksize', type=int, default=20000,
+                        help='padding bytes added to every check-content')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = synth.writefile(os.path.join(tmpdir, 'bench-xccdf.xml'),
+                                   synth.benchmark(args.rules,
+                                                   checksize=args.checksize))
+        size = os.path.getsize(filename)
+        print('input: %d rules, %.1f MiB' % (args.rules, size / 2**20))
+        print('%10s %10s %16s %12s' % ('mode', 'load (s)', 'retained (MiB)',
+                                       'peak (MiB)'))
+        for stream in (False, True):
+            elapsed, retained, peak = measure(filename, stream)
+            print('%10s %10.3f %16.1f %12.1f' % ('stream' if stream else 'tree',
+                                                 elapsed, retained / 2**20,
+                                                 peak / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+'''
+Benchmark Ckl.flatten merging many result xccdfs into many benchmark STIGs.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_merge.py [--stigs 10] [--rules 500]
+
+One results xccdf is generated for every benchmark STIG, flatten time is
+reported for a growing number of STIGs.
+'''
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def loadxccdf(data, name):
+    '''Return an Xccdf built from the xml string data.'''
+
+    source = io.StringIO(data)
+    source.name = name
+    return ckl.Xccdf(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=10,
+                        help='largest number of STIGs and result files')
+    parser.add_argument('--rules', type=int, default=500,
+                        help='number of rules per STIG')
+    args = parser.parse_args()
+
+    stigs = []
+    results = []
+    for num in range(args.stigs):
+        stigid = 'STIG_%d' % num
+        first = num * args.rules
+        stigs.append(synth.benchmark(args.rules, stigid, first=first))
+        results.append(synth.results(args.rules, stigid, first=first))
+
+    print('%8s %10s %12s' % ('stigs', 'vulns', 'flatten (s)'))
+    counts = sorted(set([args.stigs] + [2**n for n in range(args.stigs.bit_length())]))
+    for count in counts:
+        checklist = ckl.Ckl()
+        for num in range(count):
+            checklist.importxccdf(loadxccdf(stigs[num], 'stig-xccdf.xml'))
+            checklist.importxccdf(loadxccdf(results[num], 'results-xccdf.xml'))
+        start = time.perf_counter()
+        checklist.flatten()
+        elapsed = time.perf_counter() - start
+        print('%8d %10d %12.4f' % (count, count * args.rules, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''
+Benchmark parallel parsing of many input files.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_parallel.py [--files 8] [--rules 2000] [--jobs 1,2,4]
+
+Benchmark xccdfs are written to a temporary directory and loaded with
+ckl.loadxccdfs() using a growing number of worker processes.
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--files', type=int, default=8,
+                        help='number of input files')
+    parser.add_argument('--rules', type=int, default=2000,
+                        help='number of rules per file')
+    parser.add_argument('--jobs', default='1,2,4',
+                        help='comma separated worker process counts')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filenames = []
+        for num in range(args.files):
+            filenames.append(synth.writefile(
+                os.path.join(tmpdir, 'stig-%d-xccdf.xml' % num),
+                synth.benchmark(args.rules, 'STIG_%d' % num,
+                                first=num * args.rules)))
+
+        print('%d files, %d rules each, %d cpus' % (args.files, args.rules,
+                                                    os.cpu_count() or 1))
+        print('%6s %10s %10s' % ('jobs', 'load (s)', 'speedup'))
+        base = None
+        for jobs in [int(j) for j in args.jobs.split(',')]:
+            start = time.perf_counter()
+            xccdfs = ckl.loadxccdfs(filenames, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            if base is None:
+                base = elapsed
+            assert [x.getid() for x in xccdfs] == \
+                ['STIG_%d' % num for num in range(args.files)]
+            print('%6d %10.3f %9.2fx' % (jobs, elapsed, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
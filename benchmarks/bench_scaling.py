@@ -0,0 +1,154 @@
+'''
+Benchmark every checklist operation from 100 to 50k rules, checking output
+against golden checklists.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_scaling.py [--sizes 100,1000,10000,50000]
+    python benchmarks/bench_scaling.py --sizes 100,1000 --update-golden
+
+For every size a STIG zip, a results xccdf and a checklist template are
+generated, then loaded, flattened, templated and written the way the genckl
+command does. Time per rule should stay roughly flat as the rule count grows.
+
+The checklist of each size is built in tree and stream mode and compared
+with golden/scaling-SIZE.ckl.gz next to this script (uuids are ignored).
+Sizes without a golden checklist are only timed. Exits with status 1 if a
+checklist differs from its golden checklist.
+'''
+
+import argparse
+import gzip
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+UUID_RE = re.compile(
+    '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+OPERATIONS = ['load', 'results', 'import', 'flatten', 'template', 'write']
+
+
+class UnclosedStringIO(io.StringIO):
+    '''StringIO that keeps its value after being closed by Ckl.write.'''
+
+    def close(self):
+        pass
+
+
+def generate(directory, rules):
+    '''Write the synthetic input files for rules, return their filenames.'''
+
+    return (synth.writezip(os.path.join(directory, 'synthetic_stig.zip'),
+                           synth.benchmark(rules)),
+            synth.writefile(os.path.join(directory, 'synthetic_results-xccdf.xml'),
+                            synth.results(rules, profiles=2)),
+            synth.writefile(os.path.join(directory, 'synthetic_template.csv'),
+                            synth.template(rules, step=3)))
+
+
+def build(stigzip, results, template, stream):
+    '''Return (checklist text, {operation: seconds}) for the input files.'''
+
+    timings = {}
+
+    def timed(operation, function, *args):
+        start = time.perf_counter()
+        value = function(*args)
+        timings[operation] = time.perf_counter() - start
+        return value
+
+    checklist = ckl.Ckl()
+    stigs = timed('load', ckl.loadfile, stigzip, stream)
+    resultxccdfs = timed('results', ckl.loadfile, results, stream)
+    timed('import', lambda: [checklist.importxccdf(xccdf)
+                             for xccdf in stigs + resultxccdfs])
+    timed('flatten', checklist.flatten)
+    timed('template', checklist.addtemplate, template)
+    output = UnclosedStringIO()
+    timed('write', checklist.write, output)
+    return output.getvalue(), timings
+
+
+def normalize(text):
+    '''Return checklist text with every uuid replaced by zeros.'''
+
+    return UUID_RE.sub('00000000-0000-0000-0000-000000000000', text)
+
+
+def goldenpath(rules):
+    '''Return the golden checklist filename for rules.'''
+
+    return os.path.join(GOLDEN_DIR, 'scaling-%d.ckl.gz' % rules)
+
+
+def readgolden(rules):
+    '''Return the golden checklist text for rules, or None.'''
+
+    try:
+        with gzip.open(goldenpath(rules), 'rt', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def writegolden(rules, text):
+    '''Store text as the golden checklist for rules, reproducibly.'''
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with gzip.GzipFile(goldenpath(rules), 'wb', mtime=0) as f:
+        f.write(text.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', default='100,1000,10000,50000',
+                        help='comma separated rule counts')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='write the golden checklists instead of checking them')
+    args = parser.parse_args()
+
+    print('%8s' % 'rules' + ''.join('%10s' % op for op in OPERATIONS) +
+          '%10s %12s %8s' % ('stream', 'us per rule', 'golden'))
+    failed = False
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            files = generate(directory, size)
+            tree, timings = build(*files, stream=False)
+            stream, streamtimings = build(*files, stream=True)
+
+        tree = normalize(tree)
+        if args.update_golden:
+            writegolden(size, tree)
+            golden = 'written'
+        else:
+            expected = readgolden(size)
+            if expected is None:
+                golden = '-'
+            elif tree == expected and normalize(stream) == expected:
+                golden = 'ok'
+            else:
+                golden = 'DIFFERS'
+                failed = True
+        if normalize(stream) != tree:
+            golden = 'STREAM'
+            failed = True
+
+        total = sum(timings.values())
+        print('%8d' % size + ''.join('%10.3f' % timings[op] for op in OPERATIONS) +
+              '%10.3f %12.1f %8s' % (streamtimings['load'], total / size * 1e6, golden))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
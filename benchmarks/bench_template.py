@@ -0,0 +1,75 @@
+'''
+Benchmark Ckl.addtemplate with large layered templates.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_template.py [--stigs 10] [--rules 500] [--layers 5]
+
+Every template holds a row for every rule of every STIG, application time
+should grow linearly with the template size. The templates are applied one
+after another, merged into a single template, and compiled ahead of time
+(only loading the compiled template and applying it is timed).
+'''
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=10,
+                        help='number of STIGs in the checklist')
+    parser.add_argument('--rules', type=int, default=500,
+                        help='number of rules per STIG')
+    parser.add_argument('--layers', type=int, default=5,
+                        help='number of templates applied')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print('%8s %10s %12s %14s %12s %14s' % ('stigs', 'vulns', 'rows', 'apply (s)',
+                                                'merged (s)', 'compiled (s)'))
+        for count in sorted(set([1, args.stigs // 2 or 1, args.stigs])):
+            checklist = ckl.Ckl()
+            for num in range(count):
+                source = io.StringIO(synth.benchmark(
+                    args.rules, 'STIG_%d' % num, first=num * args.rules))
+                source.name = 'stig-%d-xccdf.xml' % num
+                checklist.importxccdf(ckl.Xccdf(source))
+
+            templates = []
+            for layer in range(args.layers):
+                templates.append(synth.writefile(
+                    os.path.join(tmpdir, 'template-%d.csv' % layer),
+                    synth.template(count * args.rules)))
+
+            compiled = os.path.join(tmpdir, 'compiled-%d.cklt' % count)
+            ckl.loadtemplates(templates, strict=True).write(compiled)
+
+            start = time.perf_counter()
+            for template in templates:
+                checklist.addtemplate(template)
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            checklist.addtemplate(ckl.loadtemplates(templates))
+            merged = time.perf_counter() - start
+
+            start = time.perf_counter()
+            checklist.addtemplate(compiled)
+            loaded = time.perf_counter() - start
+            print('%8d %10d %12d %14.4f %12.4f %14.4f' % (
+                count, count * args.rules, count * args.rules * args.layers,
+                elapsed, merged, loaded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Benchmark memory used per Vuln when many STIGs are held in memory.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_vulnmem.py [--stigs 20] [--rules 500]
+
+Reports traced Python memory retained by the loaded Xccdfs, divided by the
+number of vulns.
+'''
+
+import argparse
+import gc
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=20,
+                        help='number of STIGs held in memory')
+    parser.add_argument('--rules', type=int, default=500,
+                        help='number of rules per STIG')
+    args = parser.parse_args()
+
+    data = [synth.benchmark(args.rules, 'STIG_%d' % num, first=num * args.rules)
+            for num in range(args.stigs)]
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    xccdfs = []
+    for num, xml in enumerate(data):
+        source = io.StringIO(xml)
+        source.name = 'stig-%d-xccdf.xml' % num
+        xccdfs.append(ckl.Xccdf(source))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    vulns = sum(len(xccdf.getvulns()) for xccdf in xccdfs)
+    print('%d STIGs, %d vulns' % (len(xccdfs), vulns))
+    print('retained: %.1f MiB, %.0f bytes per vuln' % (retained / 2**20,
+                                                      retained / vulns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Benchmark Ckl.write time and peak memory for multi-STIG checklists.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_write.py [--stigs 10] [--rules 500]
+
+The streaming writer is compared against the minidom pretty-print round trip
+it replaced, and both outputs are checked to be identical.
+'''
+
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+from xml.dom import minidom
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+class UnclosedStringIO(io.StringIO):
+    '''StringIO that keeps its value after being closed by Ckl.write.'''
+
+    def close(self):
+        pass
+
+
+def legacywrite(checklist, output_file):
+    '''Write checklist the way Ckl.write did before it streamed output.'''
+
+    checklist.flatten()
+    tree = ElementTree.ElementTree(ElementTree.Element('CHECKLIST'))
+    asset_el = ElementTree.SubElement(tree.getroot(), 'ASSET')
+    stigs_el = ElementTree.SubElement(tree.getroot(), 'STIGS')
+    for name, value in checklist.asset.items():
+        sub_el = ElementTree.SubElement(asset_el, name)
+        sub_el.text = value
+    for xccdf in checklist.xccdfs:
+        stigs_el.append(xccdf.toelement())
+    dom = minidom.parseString(ElementTree.tostring(
+        tree.getroot(), encoding='unicode'))
+    dom = dom.toprettyxml()
+    tree = ElementTree.ElementTree(ElementTree.fromstring(dom))
+    lines = ElementTree.tostring(
+        tree.getroot(), encoding='unicode', short_empty_elements=False).splitlines()
+    lines.insert(0, '<!--DISA STIG Viewer :: 2.11-->')
+    lines.insert(0, '<?xml version="1.0" encoding="UTF-8"?>')
+    output_file.write('\n'.join(lines))
+    output_file.close()
+
+
+def measure(write, checklist):
+    '''Return (seconds, peak bytes, output) for write(checklist, file).'''
+
+    output = UnclosedStringIO()
+    start = time.perf_counter()
+    write(checklist, output)
+    elapsed = time.perf_counter() - start
+
+    # measure memory in a second run, tracing slows everything down
+    tracemalloc.start()
+    write(checklist, io.StringIO())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--stigs', type=int, default=10,
+                        help='number of STIGs in the checklist')
+    parser.add_argument('--rules', type=int, default=500,
+                        help='number of rules per STIG')
+    args = parser.parse_args()
+
+    checklist = ckl.Ckl()
+    for num in range(args.stigs):
+        source = io.StringIO(synth.benchmark(args.rules, 'STIG_%d' % num,
+                                             first=num * args.rules))
+        source.name = 'stig-%d-xccdf.xml' % num
+        checklist.importxccdf(ckl.Xccdf(source))
+
+    print('checklist: %d STIGs, %d vulns' % (args.stigs, args.stigs * args.rules))
+    print('%10s %10s %12s' % ('writer', 'time (s)', 'peak (MiB)'))
+    outputs = []
+    for name, write in (('minidom', legacywrite), ('stream', ckl.Ckl.write)):
+        elapsed, peak, output = measure(write, checklist)
+        outputs.append(output)
+        print('%10s %10.3f %12.1f' % (name, elapsed, peak / 2**20))
+    print('output size: %.1f MiB, identical: %s' % (
+        len(outputs[1]) / 2**20, outputs[0] == outputs[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''
+Benchmark Xccdf load time against the number of rules.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench_xccdf.py [--sizes 500,1000,2000,4000]
+
+For every size a results xccdf is generated and loaded, load time per rule
+should stay roughly flat as the rule count grows.
+'''
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+def timeload(data, repeat):
+    '''Return the best load time in seconds for data over repeat runs.'''
+
+    best = None
+    for _ in range(repeat):
+        source = io.StringIO(data)
+        source.name = 'synthetic-xccdf.xml'
+        start = time.perf_counter()
+        ckl.Xccdf(source)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', default='500,1000,2000,4000',
+                        help='comma separated rule counts')
+    parser.add_argument('--profiles', type=int, default=3,
+                        help='rule-results emitted per rule')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per size, best time is reported')
+    args = parser.parse_args()
+
+    print('%8s %12s %12s %14s' % ('rules', 'results', 'load (s)', 'us per rule'))
+    for size in [int(s) for s in args.sizes.split(',')]:
+        data = synth.results(size, profiles=args.profiles)
+        elapsed = timeload(data, args.repeat)
+        print('%8d %12d %12.4f %14.1f' % (size, size * args.profiles, elapsed,
+                                          elapsed / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
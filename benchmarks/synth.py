@@ -0,0 +1,288 @@
+'''
+Synthetic DISA shaped xccdf data for benchmarking genckl.
+
+Nothing in here is real STIG content, the generated files only mimic the
+structure of DISA benchmark xccdfs and SCAP results xccdfs closely enough for
+genckl to parse them.
+'''
+
+import argparse
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+XCCDF_NS = 'http://checklists.nist.gov/xccdf/1.1'
+XCCDF12_NS = 'http://checklists.nist.gov/xccdf/1.2'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+ARF_NS = 'http://scap.nist.gov/schema/asset-reporting-format/1.1'
+AI_NS = 'http://scap.nist.gov/schema/asset-identification/1.1'
+OVAL_NS = 'http://oval.mitre.org/XMLSchema/oval-system-characteristics-5'
+
+SEVERITIES = ['high', 'medium', 'low']
+RESULTS = ['pass', 'fail', 'notapplicable']
+
+DESC_FIELDS = ['VulnDiscussion', 'FalsePositives', 'FalseNegatives',
+               'Documentable', 'Mitigations', 'SeverityOverrideGuidance',
+               'PotentialImpacts', 'ThirdPartyTools', 'MitigationControl',
+               'Responsibility', 'IAControls']
+
+
+def vulnid(num):
+    '''Return the Vuln ID used for rule number num.'''
+    return 'V-%06d' % num
+
+
+def ruleid(num):
+    '''Return the Rule ID used for rule number num.'''
+    return 'SV-%06dr1_rule' % num
+
+
+def _header(stigid, title, namespace=XCCDF_NS):
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<Benchmark xmlns:dc="' + DC_NS + '" id="' + stigid +
+             '" xml:lang="en" xmlns="' + namespace + '">',
+             '<status date="2020-01-01">accepted</status>',
+             '<title>' + escape(title) + '</title>',
+             '<description>This Security Technical Implementation Guide is '
+             'synthetic benchmark data.</description>',
+             '<notice id="terms-of-use" xml:lang="en"></notice>',
+             '<reference href="https://example.invalid">'
+             '<dc:publisher>DISA</dc:publisher>'
+             '<dc:source>STIG.DOD.MIL</dc:source></reference>',
+             '<plain-text id="release-info">Release: 1 Benchmark Date: '
+             '01 Jan 2020</plain-text>',
+             '<version>1</version>']
+    return lines
+
+
+def _group(num, first, checktext, withcontent=True):
+    sev = SEVERITIES[num % len(SEVERITIES)]
+    desc = ''
+    for field in DESC_FIELDS:
+        if field == 'VulnDiscussion':
+            desc += '<' + field + '>Discussion for rule ' + str(num) + \
+                ' ' + checktext + '</' + field + '>'
+        else:
+            desc += '<' + field + '></' + field + '>'
+    content = ''
+    if withcontent:
+        content = '<check-content>Verify setting ' + str(num) + '. ' + \
+            checktext + '</check-content>'
+    return ('<Group id="' + vulnid(num) + '">'
+            '<title>SRG-OS-%06d-GPOS-00001</title>'
+            '<description>&lt;GroupDescription&gt;&lt;/GroupDescription&gt;'
+            '</description>'
+            '<Rule id="' + ruleid(num) + '" weight="10.0" severity="' + sev +
+            '"><version>SYN-%02d-%06d</version>'
+            '<title>Rule title ' + str(num) + '</title>'
+            '<description>' + escape(desc) + '</description>'
+            '<reference><dc:title>DPMS Target Synthetic</dc:title>'
+            '<dc:publisher>DISA</dc:publisher><dc:type>DPMS Target</dc:type>'
+            '<dc:subject>Synthetic</dc:subject>'
+            '<dc:identifier>4242</dc:identifier></reference>'
+            '<ident system="http://cyber.mil/legacy">V-%05d</ident>'
+            '<ident system="http://cyber.mil/legacy">SV-%05d</ident>'
+            '<ident system="http://cyber.mil/cci">CCI-%06d</ident>'
+            '<fixtext fixref="F-%06d">Fix setting ' + str(num) + '.</fixtext>'
+            '<fix id="F-%06d" />'
+            '<check system="C-%06d">'
+            '<check-content-ref href="Synthetic.xml" name="M" />' + content +
+            '</check></Rule></Group>') % (
+                num, first, num, num, num, num % 3000, num, num, num)
+
+
+def benchmark(rules, stigid='SYNTHETIC_STIG', first=0, checksize=0):
+    '''
+    Return a synthetic benchmark xccdf as a string.
+
+    rules is the number of Group/Rule pairs to generate
+    first is the number of the first rule
+    checksize is the number of padding bytes added to each check-content
+    '''
+
+    lines = _header(stigid, 'Synthetic ' + stigid + ' STIG')
+    checktext = 'x' * checksize
+    for num in range(first, first + rules):
+        lines.append(_group(num, first, checktext))
+    lines.append('</Benchmark>')
+    return '\n'.join(lines)
+
+
+def results(rules, stigid='SYNTHETIC_STIG', first=0, profiles=1):
+    '''
+    Return a synthetic SCAP results xccdf as a string.
+
+    profiles is the number of rule-result entries emitted for every rule,
+    mimicking results files that contain output for several profiles
+
+    Like SCAP tool output, the Benchmark ID is prefixed so it differs from the
+    ID of the matching benchmark xccdf.
+    '''
+
+    lines = _header('xccdf_mil.disa.stig_benchmark_' + stigid,
+                    'Synthetic ' + stigid + ' STIG')
+    for num in range(first, first + rules):
+        lines.append(_group(num, first, '', withcontent=False))
+    lines.append('<TestResult id="xccdf_synthetic_testresult" '
+                 'test-system="synth 1.0" start-time="2020-01-01T00:00:00">')
+    lines.append('<target>synthetic-host</target>')
+    for profile in range(profiles):
+        for num in range(first, first + rules):
+            result = RESULTS[(num + profile) % len(RESULTS)]
+            lines.append('<rule-result idref="' + ruleid(num) + '" '
+                         'time="2020-01-01T00:00:00" severity="medium" '
+                         'weight="10.0"><result>' + result +
+                         '</result></rule-result>')
+    lines.append('</TestResult>')
+    lines.append('</Benchmark>')
+    return '\n'.join(lines)
+
+
+def arf(rules, stigid='SYNTHETIC_STIG', first=0, ovalsize=0):
+    '''
+    Return a synthetic OpenSCAP ARF report as a string.
+
+    ovalsize is the number of OVAL system characteristics items generated,
+    real reports carry several per rule and are mostly made of them
+
+    The report holds an xccdf 1.2 benchmark, its TestResult with target facts,
+    asset identification data and OVAL system characteristics.
+    '''
+
+    benchmarkid = 'xccdf_mil.disa.stig_benchmark_' + stigid
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<arf:asset-report-collection xmlns:arf="' + ARF_NS + '" '
+             'xmlns:ai="' + AI_NS + '">',
+             '<arf:report-requests><arf:report-request id="collection1">'
+             '<arf:content>']
+    lines.extend(_header(benchmarkid, 'Synthetic ' + stigid + ' STIG',
+                         XCCDF12_NS)[1:])
+    for num in range(first, first + rules):
+        lines.append(_group(num, first, ''))
+    lines.append('</Benchmark>')
+    lines.append('</arf:content></arf:report-request></arf:report-requests>')
+
+    lines.append('<arf:assets><arf:asset id="asset0"><ai:computing-device>'
+                 '<ai:connections><ai:connection><ai:ip-address>'
+                 '<ai:ip-v4>127.0.0.1</ai:ip-v4></ai:ip-address>'
+                 '<ai:mac-address>00:00:00:00:00:00</ai:mac-address>'
+                 '</ai:connection><ai:connection><ai:ip-address>'
+                 '<ai:ip-v4>192.0.2.10</ai:ip-v4></ai:ip-address>'
+                 '<ai:mac-address>52:54:00:12:34:56</ai:mac-address>'
+                 '</ai:connection></ai:connections>'
+                 '<ai:fqdn>synthetic-host.example.invalid</ai:fqdn>'
+                 '<ai:hostname>synthetic-host</ai:hostname>'
+                 '</ai:computing-device></arf:asset></arf:assets>')
+
+    lines.append('<arf:reports><arf:report id="xccdf1"><arf:content>')
+    lines.append('<TestResult xmlns="' + XCCDF12_NS + '" '
+                 'id="xccdf_org.open-scap_testresult_synthetic" '
+                 'test-system="cpe:/a:redhat:openscap:1.3.5" '
+                 'start-time="2020-01-01T00:00:00">')
+    lines.append('<benchmark href="#scap_synthetic_comp" id="' + benchmarkid + '"/>')
+    lines.append('<target>synthetic-host</target>'
+                 '<target-address>127.0.0.1</target-address>'
+                 '<target-address>192.0.2.10</target-address>'
+                 '<target-facts>'
+                 '<fact name="urn:xccdf:fact:scanner:name" type="string">'
+                 'OpenSCAP</fact>'
+                 '<fact name="urn:xccdf:fact:asset:identifier:fqdn" '
+                 'type="string">synthetic-host.example.invalid</fact>'
+                 '<fact name="urn:xccdf:fact:asset:identifier:host_name" '
+                 'type="string">synthetic-host</fact>'
+                 '<fact name="urn:xccdf:fact:ethernet:MAC" type="string">'
+                 '00:00:00:00:00:00</fact>'
+                 '<fact name="urn:xccdf:fact:ethernet:MAC" type="string">'
+                 '52:54:00:12:34:56</fact>'
+                 '<fact name="urn:xccdf:fact:asset:identifier:ipv4" '
+                 'type="string">127.0.0.1</fact>'
+                 '<fact name="urn:xccdf:fact:asset:identifier:ipv4" '
+                 'type="string">192.0.2.10</fact>'
+                 '</target-facts>')
+    for num in range(first, first + rules):
+        lines.append('<rule-result idref="' + ruleid(num) + '" '
+                     'time="2020-01-01T00:00:00" severity="medium" '
+                     'weight="10.0"><result>' + RESULTS[num % len(RESULTS)] +
+                     '</result><check system="http://oval.mitre.org/XMLSchema/'
+                     'oval-definitions-5"><check-content-ref name="oval:' +
+                     str(num) + '" href="#oval0"/></check></rule-result>')
+    lines.append('</TestResult></arf:content></arf:report>')
+
+    lines.append('<arf:report id="oval0"><arf:content>'
+                 '<oval_system_characteristics xmlns="' + OVAL_NS + '">'
+                 '<system_data>')
+    for num in range(ovalsize):
+        lines.append('<file_item id="%d" status="exists"><path>/synthetic/%d'
+                     '</path><filename>file%d.conf</filename><user_id>0'
+                     '</user_id><group_id>0</group_id><size>%d</size>'
+                     '</file_item>' % (num, num % 100, num, num * 7))
+    lines.append('</system_data></oval_system_characteristics>'
+                 '</arf:content></arf:report></arf:reports>')
+    lines.append('</arf:asset-report-collection>')
+    return '\n'.join(lines)
+
+
+def writefile(path, data):
+    '''Write data to path, creating parent directories, return path.'''
+
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    return path
+
+
+def writezip(path, data, membername='U_Synthetic_STIG_V1R1_Manual-xccdf.xml'):
+    '''Write a STIG zip containing the xccdf string data to path, return path.'''
+
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as stigzip:
+        stigzip.writestr(membername, data)
+    return path
+
+
+def template(rules, first=0, step=1, status='Not A Finding'):
+    '''
+    Return a synthetic csv checklist template as a string.
+
+    A row is generated for every step-th rule number in the range, rows carry
+    a status, finding details, comments and a severity override.
+    '''
+
+    lines = ['ID,Status,Finding Details,Comments,Severity Override,'
+             'Severity Override Justification']
+    for num in range(first, first + rules, step):
+        lines.append(vulnid(num) + ',' + status + ',"Checked rule ' + str(num) +
+                     '","Template comment, rule ' + str(num) + '",Cat ' +
+                     str(num % 3 + 1) + ',Synthetic justification')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic STIG zip, results xccdf and checklist '
+        'template to a directory.')
+    parser.add_argument('--rules', type=int, default=1000,
+                        help='number of rules')
+    parser.add_argument('--profiles', type=int, default=1,
+                        help='rule-results emitted per rule')
+    parser.add_argument('--step', type=int, default=3,
+                        help='emit a template row for every step-th rule')
+    parser.add_argument('--checksize', type=int, default=0,
+                        help='padding bytes added to each check-content')
+    parser.add_argument('directory', help='output directory')
+    args = parser.parse_args()
+
+    print(writezip(os.path.join(args.directory, 'synthetic_stig.zip'),
+                   benchmark(args.rules, checksize=args.checksize)))
+    print(writefile(os.path.join(args.directory, 'synthetic_results-xccdf.xml'),
+                    results(args.rules, profiles=args.profiles)))
+    print(writefile(os.path.join(args.directory, 'synthetic_template.csv'),
+                    template(args.rules, step=args.step)))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,8 +13,9 @@ Source0: %{name}-%{version}.tar.gz
 Group: Applications/File
 BuildArch: noarch
 Provides: %{_bindir}/%{name}
-BuildRequires: python3 >= 3.6
-Requires: python3 >= 3.6
+BuildRequires: python3 >= 3.7
+Requires: python3 >= 3.7
+Recommends: python3-pyyaml
 AutoReq: no
 
 %description
@@ -1,8 +1,16 @@
 __version__ = '1.0.0'
 
+import os
 import sys
+import csv
 import argparse
 from . import ckl
+from . import batch
+from . import stats
+from . import serve
+from . import report
+from . import migrate
+from .cache import XccdfCache, loadtemplatelayers
 
 prog = 'genckl'
 usage = prog+' [options] FILE [FILE ...]'
@@ -10,56 +18,198 @@ description = 'Generate a ckl file based on STIG zip and/or xccdf file(s)'
 epilog = 'Full documentation available locally via: \'man genckl\''
 
 
+def addloadarguments(parser, select=True):
+    '''
+    Add the arguments controlling how input files are loaded to parser.
+
+    select should be False to leave out the --select argument
+    '''
+
+    parser.add_argument('--cache', action='store_true',
+                        help='cache parsed STIGs on disk to speed up later runs')
+    parser.add_argument('--cache-dir',
+                        help='cache directory, implies --cache, defaults to ~/.cache/genckl', metavar='DIR')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='maximum cache size in MiB, defaults to 256', metavar='MIB')
+    parser.add_argument('--stream', action='store_true',
+                        help='parse input files incrementally to reduce memory use')
+    if select:
+        parser.add_argument('--select', action='append',
+                            help='only use xccdfs in zip files whose name or benchmark ID matches the glob PATTERN, '
+                            'can be specified multiple times', metavar='PATTERN')
+
+
+def addoutputarguments(parser):
+    '''Add the arguments controlling output format and compression to parser.'''
+
+    parser.add_argument('--format', choices=ckl.FORMATS,
+                        help='checklist format, ckl (STIG Viewer 2) or cklb (STIG Viewer 3), defaults to cklb for '
+                        '.cklb output filenames and ckl otherwise')
+    parser.add_argument('--compress', choices=sorted(ckl.COMPRESSIONS),
+                        help='compress checklists as they are written')
+    parser.add_argument('--compress-level', type=int,
+                        help='compression level, defaults to 6 (3 for zstd)', metavar='N')
+
+
+def getcompression(parser, args, filename=None, default=None):
+    '''
+    Return the (compression, level) tuple selected by args.
+
+    filename may be the output filename, its suffix selects the compression
+    when --compress is not given
+    default is the compression used if none is selected
+    '''
+
+    compression = args.compress or ckl.getoutputcompression(filename) or default
+    if compression == 'zstd' and ckl.zstd is None:
+        parser.error('zstd compression needs python 3.14 or the zstandard module')
+    if args.compress_level is not None:
+        if compression is None:
+            parser.error('--compress-level needs --compress')
+        suffix, level, minimum, maximum = ckl.COMPRESSIONS[compression]
+        if not minimum <= args.compress_level <= maximum:
+            parser.error('--compress-level should be ' + str(minimum) + ' to ' +
+                         str(maximum) + ' for ' + compression)
+    return compression, args.compress_level
+
+
+def getcache(args):
+    '''Return an XccdfCache if enabled by args, otherwise None.'''
+
+    if args.cache or args.cache_dir:
+        cache = XccdfCache(args.cache_dir, args.cache_size*1024*1024)
+        if not cache.private:
+            print(prog + ': ' + cache.directory + ': cache directory is owned or writable by another user, '
+                  'the cache is not used', file=sys.stderr)
+        return cache
+    return None
+
+
 def run():
 
+    # run subcommand if given
+    if sys.argv[1:2] == ['batch']:
+        return runbatch(sys.argv[2:])
+    if sys.argv[1:2] == ['serve']:
+        return runserve(sys.argv[2:])
+    if sys.argv[1:2] == ['report']:
+        return runreport(sys.argv[2:])
+    if sys.argv[1:2] == ['migrate']:
+        return runmigrate(sys.argv[2:])
+    if sys.argv[1:2] == ['compile-template']:
+        return runcompiletemplate(sys.argv[2:])
+
     # setup arg parser
     parser = argparse.ArgumentParser(
         prog=prog, usage=usage, description=description, epilog=epilog)
 
     parser.add_argument('-o', '--output', default=sys.stdout,
                         help='output filename, defaults to standard output', metavar='FILE')
+    parser.add_argument('--connect',
+                        help='have the genckl server listening on SOCKET build the checklist', metavar='SOCKET')
     parser.add_argument('-r', '--run-commands', action='store_true',
                         help='enable template command execution')
+    parser.add_argument('--command-jobs', type=int, default=4,
+                        help='number of template commands run at the same time, defaults to 4', metavar='N')
+    parser.add_argument('--command-timeout', type=float,
+                        help='template command timeout, defaults to no timeout', metavar='SECONDS')
     parser.add_argument('-s', '--set-hostdata', action='store_true',
                         help='set checklist host data based on localhost')
+    parser.add_argument('--hostdata-timeout', type=float, default=2.0,
+                        help='timeout of the host name lookups, defaults to 2', metavar='SECONDS')
+    parser.add_argument('-u', '--update',
+                        help='existing checklist (ckl or cklb) to update, input files and templates are applied on top of it',
+                        metavar='FILE')
+    parser.add_argument('--profile',
+                        help='write phase timings and counters to FILE as json', metavar='FILE')
+    addoutputarguments(parser)
+
+    addloadarguments(parser)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used to parse input files, defaults to 1', metavar='N')
 
-    # NEEDFIX add support for yaml templates, csv might not always be so great
     parser.add_argument('-t', '--template', action='append',
-                        help='checklist template filename, can be specified multiple times', metavar='FILE')
-    # parser.add_argument('--template-dir', help='NOT IMPLEMENTED', metavar='DIR')  # NEEDFIX
+                        help='checklist template filename (csv, yaml, json or compiled), can be specified multiple '
+                        'times', metavar='FILE')
+    parser.add_argument('--template-dir', action='append',
+                        help='directory of checklist templates applied in sorted order before --template, can be '
+                        'specified multiple times', metavar='DIR')
     parser.add_argument('-V', '--version', action='version',
                         version='%(prog)s '+__version__)
-    parser.add_argument('input_files', nargs='+',
-                        help='xccdf filename or STIG zip filename', metavar='FILE')
+    parser.add_argument('input_files', nargs='*',
+                        help='xccdf filename, ARF report filename or STIG zip filename', metavar='FILE')
 
-    # parse args
+    # parse args, input files are optional when updating a checklist
     args = parser.parse_args()
+    if not args.input_files and not args.update:
+        parser.error('the following arguments are required: FILE')
+    if args.connect and args.update:
+        parser.error('--update can not be used with --connect')
+
+    # the server parses, caches and profiles on its own, these would be ignored
+    if args.connect:
+        for name in ('jobs', 'stream', 'cache', 'cache_dir', 'cache_size',
+                     'profile', 'hostdata_timeout'):
+            if getattr(args, name) != parser.get_default(name):
+                parser.error('--' + name.replace('_', '-') + ' can not be used with --connect')
+    if args.jobs < 1 or args.command_jobs < 1:
+        parser.error('--jobs and --command-jobs should be at least 1')
+    for directory in args.template_dir or []:
+        if not os.path.isdir(directory):
+            parser.error(directory + ': not a directory')
+    compression, level = getcompression(parser, args, args.output)
+    fmt = args.format or ckl.getformat(args.output)
+
+    # hand the checklist off to a genckl server if requested
+    if args.connect:
+        return runclient(args, fmt, compression, level)
 
     try:
-        # convert any given zip files to open xccdfs, create list of xccdfs
-        xccdfs = []
-        for input_file in args.input_files:
-            if input_file[-4:] == '.zip':
-                xccdfs.append(ckl.openstigzip(input_file))
-            else:
-                xccdfs.append(input_file)
-
-        # create checklist, import all xccdfs
-        checklist = ckl.Ckl()
-        for xccdf in xccdfs:
-            checklist.importxccdf(ckl.Xccdf(xccdf))
-
-        # add all templates, running commands if enabled
-        if args.template:
-            for template in args.template:
-                checklist.addtemplate(template, args.run_commands)
-
-        # set host data if enabled
+        # collect phase timings and counters if enabled
+        if args.profile:
+            stats.enable()
+
+        # gather host data in the background while the checklist is built,
+        # a slow resolver then only delays the run by what is left of it
         if args.set_hostdata:
-            checklist.sethostdata()
+            hostdata = ckl.Background(ckl.gethostdata, args.hostdata_timeout)
+
+        # setup STIG cache if enabled, template directories are cached with it
+        cache = getcache(args)
+
+        # create checklist, or read the one being updated, then import all
+        # xccdfs in command line order
+        if args.update:
+            checklist = ckl.readchecklist(args.update)
+        else:
+            checklist = ckl.Ckl()
+        for xccdf in ckl.loadxccdfs(args.input_files, args.stream, cache, args.jobs, args.select):
+            checklist.importxccdf(xccdf)
+
+        # merge all templates and apply them at once, running commands if
+        # enabled. All commands are run up front, concurrently, then spliced
+        # into rows as the template is added
+        if args.template or args.template_dir:
+            template = loadtemplatelayers(
+                args.template_dir or [], args.template or [], cache)
+            if args.run_commands:
+                checklist.runtemplatecmds(
+                    [template], args.command_jobs, args.command_timeout)
+            checklist.addtemplate(
+                template, args.run_commands, args.command_timeout)
+
+        # set host data if enabled, gathering it again if the background
+        # call failed or did not finish in time
+        if args.set_hostdata:
+            checklist.sethostdata(hostdata.result(args.hostdata_timeout),
+                                  args.hostdata_timeout)
 
         # write out checklist
-        checklist.write(args.output)
+        checklist.write(args.output, compression, level, fmt)
+
+        # write out phase timings and counters
+        if args.profile:
+            stats.dump(args.profile)
 
     # ignore ctrl-c
     except KeyboardInterrupt:
@@ -71,3 +221,241 @@ def run():
             pass
         else:
             raise err
+
+
+def runbatch(argv):
+    '''Run the batch subcommand with the given argument list.'''
+
+    # setup arg parser
+    parser = argparse.ArgumentParser(
+        prog=prog+' batch', usage=prog+' batch [options] -m MANIFEST FILE [FILE ...]',
+        description='Generate a ckl file per host in a manifest, parsing STIG zip and/or xccdf file(s) once',
+        epilog=epilog)
+
+    parser.add_argument('-m', '--manifest', required=True,
+                        help='json manifest of hosts, see manual for the format', metavar='FILE')
+    parser.add_argument('-d', '--output-dir', default=os.curdir,
+                        help='directory checklists are written to, defaults to current directory', metavar='DIR')
+    parser.add_argument('-b', '--bundle',
+                        help='zip file all checklists are written to instead of the output directory', metavar='FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes, defaults to cpu count', metavar='N')
+    addoutputarguments(parser)
+    addloadarguments(parser)
+    parser.add_argument('input_files', nargs='+',
+                        help='xccdf filename or STIG zip filename used for every host', metavar='FILE')
+
+    # parse args
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs should be at least 1')
+
+    try:
+        hosts = batch.readmanifest(args.manifest, args.format or 'ckl')
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+    compression, level = getcompression(
+        parser, args, default='gzip' if args.bundle else None)
+    if args.bundle and batch.BUNDLE_COMPRESSIONS[compression] is None:
+        parser.error(compression + ' compression in zip files needs python 3.14')
+
+    try:
+        # parse the shared STIGs once
+        cache = getcache(args)
+        xccdfs = ckl.loadxccdfs(
+            args.input_files, args.stream, cache, args.jobs, args.select)
+
+        # build every host's checklist, report failed hosts
+        failures = batch.generate(
+            xccdfs, hosts, args.output_dir, args.jobs, args.stream,
+            compression, level, args.bundle, args.format)
+        for host, error in failures:
+            print(prog + ': ' + host + ': ' + error, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
+
+
+def runclient(args, fmt='ckl', compression=None, level=None):
+    '''
+    Request the checklist described by args from a genckl server.
+
+    fmt should be the checklist format (see ckl.FORMATS)
+    compression and level are passed on to serve.connect()
+    '''
+
+    request = {'inputs': [os.path.abspath(name) for name in args.input_files],
+               'templates': [os.path.abspath(name) for name in args.template or []],
+               'template_dirs': [os.path.abspath(name) for name in args.template_dir or []],
+               'select': args.select,
+               'run_commands': args.run_commands,
+               'command_jobs': args.command_jobs,
+               'command_timeout': args.command_timeout,
+               'set_hostdata': args.set_hostdata,
+               'format': fmt}
+    output = args.output
+    if output == sys.stdout:
+        output = sys.stdout.buffer
+
+    try:
+        serve.connect(args.connect, request, output, compression, level)
+
+    # report server and connection errors
+    except (OSError, ValueError) as err:
+        if isinstance(err, BrokenPipeError) and args.output == sys.stdout:
+            return
+        print(prog + ': ' + args.connect + ': ' + str(err), file=sys.stderr)
+        sys.exit(1)
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
+
+
+def runserve(argv):
+    '''Run the serve subcommand with the given argument list.'''
+
+    # setup arg parser
+    parser = argparse.ArgumentParser(
+        prog=prog+' serve', usage=prog+' serve [options] SOCKET',
+        description='Serve checklists on a Unix domain socket, keeping parsed STIGs in memory',
+        epilog=epilog)
+
+    parser.add_argument('--memory', type=int, default=512,
+                        help='maximum memory used by parsed STIGs in MiB, defaults to 512', metavar='MIB')
+    addloadarguments(parser, select=False)
+    parser.add_argument('socket', help='socket filename', metavar='SOCKET')
+
+    # parse args
+    args = parser.parse_args(argv)
+
+    try:
+        memory = serve.XccdfMemory(
+            args.memory*1024*1024, getcache(args), args.stream)
+        serve.serve(args.socket, memory)
+    except OSError as err:
+        parser.error(str(err))
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
+
+
+def runreport(argv):
+    '''Run the report subcommand with the given argument list.'''
+
+    # setup arg parser
+    parser = argparse.ArgumentParser(
+        prog=prog+' report', usage=prog+' report [options] PATH [PATH ...]',
+        description='Summarize compliance across ckl files and directories of ckl files',
+        epilog=epilog)
+
+    parser.add_argument('-d', '--output-dir', default=os.curdir,
+                        help='directory report tables are written to, defaults to current directory', metavar='DIR')
+    parser.add_argument('-f', '--format', choices=['csv', 'json'], default='csv',
+                        help='report table format, defaults to csv')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of processes reading ckl files, defaults to cpu count', metavar='N')
+    parser.add_argument('paths', nargs='+',
+                        help='ckl or cklb filename, or directory searched for checklists', metavar='PATH')
+
+    # parse args
+    args = parser.parse_args(argv)
+
+    try:
+        # report unreadable checklists, the rest are still counted
+        failures = report.generate(
+            args.paths, args.output_dir, args.format, args.jobs)
+        for filename, error in failures:
+            print(prog + ': ' + filename + ': ' + error, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
+
+
+def runmigrate(argv):
+    '''Run the migrate subcommand with the given argument list.'''
+
+    # setup arg parser
+    parser = argparse.ArgumentParser(
+        prog=prog+' migrate', usage=prog+' migrate [options] -n FILE -d DIR PATH [PATH ...]',
+        description='Carry checklist statuses forward to new STIG releases',
+        epilog=epilog)
+
+    parser.add_argument('-n', '--new', action='append', required=True,
+                        help='new release STIG zip filename or xccdf filename, can be specified multiple times',
+                        metavar='FILE')
+    parser.add_argument('-d', '--output-dir', required=True,
+                        help='directory migrated checklists are written to', metavar='DIR')
+    parser.add_argument('--report',
+                        help='csv file listing new, changed and removed rules, defaults to DIR/migration.csv',
+                        metavar='FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes, defaults to cpu count', metavar='N')
+    addloadarguments(parser)
+    parser.add_argument('paths', nargs='+',
+                        help='ckl or cklb filename, or directory searched for checklists', metavar='PATH')
+
+    # parse args
+    args = parser.parse_args(argv)
+
+    try:
+        tasks = migrate.outputtasks(args.paths, args.output_dir)
+    except ValueError as err:
+        parser.error(str(err))
+
+    try:
+        # parse the new releases once
+        cache = getcache(args)
+        xccdfs = ckl.loadxccdfs(
+            args.new, args.stream, cache, args.jobs, args.select)
+
+        # migrate every checklist, report failed checklists
+        os.makedirs(args.output_dir, exist_ok=True)
+        reportfile = args.report or os.path.join(
+            args.output_dir, 'migration.csv')
+        failures = migrate.migrate(xccdfs, tasks, reportfile, args.jobs)
+        for filename, error in failures:
+            print(prog + ': ' + filename + ': ' + error, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
+
+
+def runcompiletemplate(argv):
+    '''Run the compile-template subcommand with the given argument list.'''
+
+    # setup arg parser
+    parser = argparse.ArgumentParser(
+        prog=prog+' compile-template', usage=prog+' compile-template [options] -o FILE TEMPLATE [TEMPLATE ...]',
+        description='Validate and merge checklist templates into a single compiled template',
+        epilog=epilog)
+
+    parser.add_argument('-o', '--output', required=True,
+                        help='compiled template filename', metavar='FILE')
+    parser.add_argument('templates', nargs='+',
+                        help='checklist template filename, applied in order', metavar='TEMPLATE')
+
+    # parse args
+    args = parser.parse_args(argv)
+
+    try:
+        ckl.loadtemplates(args.templates, strict=True).write(args.output)
+
+    # report the template that failed, nothing is written
+    except (OSError, ValueError, csv.Error) as err:
+        print(prog + ': ' + str(err), file=sys.stderr)
+        sys.exit(1)
+
+    # ignore ctrl-c
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,293 @@
+import os
+import io
+import json
+import pickle
+import zipfile
+import multiprocessing
+from . import ckl
+
+# pickled benchmark Xccdfs, shared read-only by every checklist a worker builds
+benchmarks = None
+
+# zip member compression of each output compression, zstd needs python 3.14
+BUNDLE_COMPRESSIONS = {'gzip': zipfile.ZIP_DEFLATED, 'xz': zipfile.ZIP_LZMA,
+                       'zstd': getattr(zipfile, 'ZIP_ZSTANDARD', None)}
+
+
+class UnclosedBytesIO(io.BytesIO):
+    '''BytesIO keeping its value after being closed by Ckl.write().'''
+
+    def close(self):
+        pass
+
+
+def readmanifest(filename, fmt='ckl'):
+    '''
+    Return a list of host dictionaries read from a batch manifest file.
+
+    filename should be a json filename, the file should contain a list of
+    objects with the following keys (only "host" is required):
+     - host: host name, sets HOST_NAME and the default output filename
+     - output: output filename, defaults to "<host>.<fmt>"
+     - inputs: list of xccdf filenames or STIG zip filenames (usually results)
+     - templates: list of checklist template filenames
+     - asset: object with checklist asset data ("HOST_IP", "ROLE", etc.)
+
+    Relative filenames are relative to the directory containing the manifest.
+    Output filenames should be relative paths inside the output directory,
+    each used by a single host.
+    fmt should be the default output format (see ckl.FORMATS)
+    Raises ValueError if the manifest is not valid.
+    '''
+
+    with open(filename) as f:
+        entries = json.load(f)
+
+    basedir = os.path.dirname(os.path.abspath(filename))
+    assetkeys = ckl.Ckl().asset.keys()
+
+    if not isinstance(entries, list):
+        raise ValueError(filename + ': manifest should be a list of hosts')
+
+    hosts = []
+    outputs = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('host') or \
+                not isinstance(entry['host'], str):
+            raise ValueError(filename + ': every manifest entry needs a host')
+        prefix = filename + ': ' + entry['host']
+        for key in ('inputs', 'templates'):
+            if not isinstance(entry.get(key, []), list) or \
+                    not all(isinstance(value, str) for value in entry.get(key, [])):
+                raise ValueError(prefix + ': ' + key + ' should be a list of filenames')
+        if not isinstance(entry.get('asset', {}), dict) or \
+                not all(isinstance(value, str) for value in entry.get('asset', {}).values()):
+            raise ValueError(prefix + ': asset should be an object of strings')
+        for key in entry.get('asset', {}):
+            if key not in assetkeys:
+                raise ValueError(prefix + ': unknown asset key ' + key)
+
+        # outputs stay inside the output directory (or bundle), one host each
+        output = entry.get('output', entry['host'] + '.' + fmt)
+        if not isinstance(output, str) or not output:
+            raise ValueError(prefix + ': output should be a filename')
+        output = os.path.normpath(output)
+        if os.path.isabs(output) or output.split(os.sep)[0] in (os.pardir, os.curdir):
+            raise ValueError(prefix + ': output should be a path inside the output directory')
+        if os.path.normcase(output) in outputs:
+            raise ValueError(prefix + ': output ' + output + ' is used by another host')
+        outputs.add(os.path.normcase(output))
+
+        host = {'host': entry['host'],
+                'output': output,
+                'inputs': [os.path.join(basedir, name) for name in entry.get('inputs', [])],
+                'templates': [os.path.join(basedir, name) for name in entry.get('templates', [])],
+                'asset': dict(entry.get('asset', {}))}
+        hosts.append(host)
+
+    return hosts
+
+
+def generate(xccdfs, hosts, outdir, jobs=1, stream=False, compression=None,
+             level=None, bundle=None, fmt=None):
+    '''
+    Write one checklist per host, all sharing the same benchmark Xccdfs.
+
+    xccdfs should be a list of parsed benchmark Xccdf objects
+    hosts should be a list of host dictionaries (see readmanifest())
+    outdir should be the directory checklists are written to
+    jobs should be the number of worker processes
+    stream is passed on to Xccdf when parsing host input files
+    compression and level are passed on to Ckl.write(), the suffix of the
+    compression is added to output filenames
+    bundle may be a zip filename, checklists are then added to it in manifest
+    order instead of written to outdir (see writebundle())
+    fmt may be a checklist format (see ckl.FORMATS), by default each host's
+    format is taken from its output filename (see ckl.getformat())
+
+    Returns a list of (host, error message) tuples for hosts that failed.
+    '''
+
+    for xccdf in xccdfs:
+        xccdf.parsedescriptions()
+    blob = pickle.dumps(xccdfs, pickle.HIGHEST_PROTOCOL)
+    if bundle is not None:
+        return writebundle(blob, hosts, bundle, jobs, stream, compression, level, fmt)
+
+    os.makedirs(outdir, exist_ok=True)
+    tasks = [(host, outdir, stream, compression, level, fmt) for host in hosts]
+
+    # no pool for a single job, keeps errors and ctrl-c simple
+    if jobs == 1 or len(hosts) < 2:
+        initworker(blob)
+        results = map(buildhost, tasks)
+        return [result for result in results if result]
+
+    pool = multiprocessing.Pool(jobs, initworker, (blob,))
+    try:
+        results = pool.imap_unordered(buildhost, tasks)
+        failures = [result for result in results if result]
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return failures
+
+
+def writebundle(blob, hosts, bundle, jobs=1, stream=False, compression=None,
+                level=None, fmt=None):
+    '''
+    Write one checklist per host into a single zip file.
+
+    blob should be the pickled benchmark Xccdfs
+    bundle should be the zip filename
+    compression selects how members are compressed, defaults to "gzip"
+    (deflate), level is the compression level
+    see generate() for the other arguments
+
+    Members are named after each host's output filename (see membername()).
+    Each checklist is written in memory first, by the worker processes when
+    there are several jobs, and only added to the zip once complete, so a
+    failed host never leaves a partial member behind.
+    '''
+
+    method = BUNDLE_COMPRESSIONS.get(compression or 'gzip')
+    if method is None:
+        raise ValueError(compression + ' compression is not supported in zip files '
+                         'by this python version')
+
+    failures = []
+    dirname = os.path.dirname(bundle)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tasks = [(host, stream, fmt) for host in hosts]
+    with zipfile.ZipFile(bundle, 'w', method, compresslevel=level) as bundlefile:
+
+        def add(result):
+            host, data, failure = result
+            if failure:
+                failures.append(failure)
+            else:
+                bundlefile.writestr(membername(host['output']), data)
+
+        # no pool for a single job, keeps errors and ctrl-c simple
+        if jobs == 1 or len(hosts) < 2:
+            initworker(blob)
+            for result in map(bundlehost, tasks):
+                add(result)
+            return failures
+
+        pool = multiprocessing.Pool(jobs, initworker, (blob,))
+        try:
+            for result in pool.imap(bundlehost, tasks):
+                add(result)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    return failures
+
+
+def membername(output):
+    '''
+    Return the zip member name of an output filename.
+
+    Raises ValueError if output is not a relative path staying inside the zip.
+    '''
+
+    name = os.path.normpath(output)
+    if os.path.isabs(name) or name.split(os.sep)[0] in (os.pardir, os.curdir):
+        raise ValueError(output + ': output should be a path inside the bundle')
+    return '/'.join(name.split(os.sep))
+
+
+def initworker(blob):
+    '''Store the pickled benchmark Xccdfs for buildhost().'''
+
+    global benchmarks
+    benchmarks = blob
+
+
+def buildchecklist(host, stream=False):
+    '''
+    Return the Ckl of a single host.
+
+    host should be a host dictionary (see readmanifest())
+    stream is passed on to Xccdf when parsing host input files
+    '''
+
+    # every checklist gets its own copy of the benchmarks, with new uuids
+    checklist = ckl.Ckl()
+    for xccdf in pickle.loads(benchmarks):
+        xccdf.newuuids()
+        checklist.importxccdf(xccdf)
+
+    for input_file in host['inputs']:
+        for xccdf in ckl.loadfile(input_file, stream):
+            checklist.importxccdf(xccdf)
+
+    if host['templates']:
+        checklist.addtemplate(ckl.loadtemplates(host['templates']))
+
+    checklist.asset['HOST_NAME'] = host['host']
+    checklist.asset.update(host['asset'])
+    return checklist
+
+
+def buildhost(task):
+    '''
+    Build and write the checklist for a single host.
+
+    task should be a (host dictionary, output directory, stream, compression,
+    level, format) tuple
+
+    Returns None, or a (host, error message) tuple if the checklist failed.
+    '''
+
+    host, outdir, stream, compression, level, fmt = task
+    try:
+        checklist = buildchecklist(host, stream)
+        output = os.path.join(outdir, host['output'])
+        if compression and not output.endswith(ckl.COMPRESSIONS[compression][0]):
+            output = output + ckl.COMPRESSIONS[compression][0]
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        checklist.write(output, compression, level,
+                        fmt or ckl.getformat(host['output']))
+
+    # report the failure, other hosts are still built
+    except Exception as err:
+        return (host['host'], str(err) or type(err).__name__)
+
+    return None
+
+
+def bundlehost(task):
+    '''
+    Build the checklist for a single host and return it written in memory.
+
+    task should be a (host dictionary, stream, format) tuple
+
+    Returns a (host dictionary, checklist bytes, None) tuple, or a (host
+    dictionary, None, (host, error message)) tuple if the checklist failed.
+    '''
+
+    host, stream, fmt = task
+    try:
+        # a bad member name fails the host before its checklist is built
+        membername(host['output'])
+        output = UnclosedBytesIO()
+        buildchecklist(host, stream).write(io.TextIOWrapper(output, encoding='UTF-8'),
+                                           fmt=fmt or ckl.getformat(host['output']))
+
+    # report the failure, other hosts are still built
+    except Exception as err:
+        return (host, None, (host['host'], str(err) or type(err).__name__))
+
+    return (host, output.getvalue(), None)
+
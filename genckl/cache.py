@@ -0,0 +1,341 @@
+import os
+import io
+import json
+import hashlib
+import pickle
+import tempfile
+from . import __version__
+from . import ckl
+from . import stats
+
+
+class XccdfCache():
+    '''
+    This class represents an on-disk cache of parsed benchmark Xccdfs.
+
+    directory should be the cache directory, it is created if needed
+    maxsize should be the maximum total size of cached entries in bytes
+
+    Entries are keyed by the SHA-256 of the xccdf data, the genckl version and
+    the cache format, entries written by other versions are removed. Xccdfs
+    with results are never cached. When the cache grows past maxsize the least
+    recently used entries are removed.
+
+    Entries are pickled, so they are only used if the directory and the entry
+    are owned by the current user and nobody else can write to them (see
+    isprivate()), private is False when the directory is not.
+    '''
+
+    # bumped whenever the pickled Xccdf or Vuln layout changes
+    FORMAT = 3
+
+    def __init__(self, directory=None, maxsize=256*1024*1024):
+
+        if directory is None:
+            directory = defaultdirectory()
+        self.directory = directory
+        self.maxsize = maxsize
+        self.suffix = '-' + __version__ + '.' + str(XccdfCache.FORMAT) + '.pickle'
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.private = isprivate(os.stat(self.directory))
+
+    def load(self, source, stream=False):
+        '''
+        Return an Xccdf for source, from the cache if possible.
+
+        source is a filename or file object containing XML data in xccdf format
+        stream is passed on to Xccdf when source has to be parsed
+        '''
+
+        # try to open, assume already open if wrong type
+        try:
+            xml = open(source, 'rb')
+        except TypeError:
+            xml = source
+
+        # hash the data, rewind or keep a copy of it for parsing
+        digest = hashlib.sha256()
+        if xml.seekable():
+            chunk = xml.read(1024*1024)
+            while chunk:
+                digest.update(tobytes(chunk))
+                chunk = xml.read(1024*1024)
+            xml.seek(0)
+        else:
+            data = xml.read()
+            digest.update(tobytes(data))
+            name = xml.name
+            xml.close()
+            xml = io.BytesIO(tobytes(data))
+            xml.name = name
+        path = os.path.join(self.directory, digest.hexdigest() + self.suffix)
+
+        # return cached Xccdf, with new uuids and the current filename
+        xccdf = self.get(path)
+        if xccdf is not None:
+            stats.count('cache_hits')
+            xccdf.newuuids()
+            xccdf.attrs['filename'] = os.path.basename(xml.name)
+            xml.close()
+            return xccdf
+
+        # parse and store, results differ from host to host so skip those
+        stats.count('cache_misses')
+        xccdf = ckl.Xccdf(xml, stream)
+        if not xccdf.hasresults:
+            xccdf.parsedescriptions()
+            self.put(path, xccdf)
+        return xccdf
+
+    def get(self, path):
+        '''Return the Xccdf cached at path, or None.'''
+
+        # unpickling can run code, never load what someone else could write
+        if not self.private:
+            return None
+
+        # load entry, mark it as recently used
+        try:
+            with open(path, 'rb') as f:
+                if not isprivate(os.fstat(f.fileno())):
+                    return None
+                xccdf = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        # treat unreadable entries as missing
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, TypeError, ValueError):
+            self.remove(path)
+            return None
+
+        return xccdf
+
+    def put(self, path, xccdf):
+        '''Store xccdf at path, then evict old entries.'''
+
+        if not self.private:
+            return
+
+        # write to a temp file first so concurrent runs never see partial entries
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(xccdf, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, path)
+        except OSError:
+            self.remove(tmppath)
+            return
+
+        self.evict()
+
+    def evict(self):
+        '''Remove entries from other versions, then the oldest over maxsize.'''
+
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.pickle'):
+                continue
+            if not name.endswith(self.suffix):
+                self.remove(path)
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        # newest first, remove everything past maxsize
+        entries.sort(reverse=True)
+        total = 0
+        for mtime, size, path in entries:
+            total = total + size
+            if total > self.maxsize:
+                self.remove(path)
+
+    def remove(self, path):
+        '''Remove path, ignoring errors.'''
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TemplateCache():
+    '''
+    This class represents an on-disk cache of merged template directories.
+
+    directory should be the cache directory, it is created if needed
+
+    Each template directory has a single entry, keyed by its absolute path,
+    holding a manifest of its template files (modification time, size and
+    SHA-256) with their parsed Templates, and the merged Template. When no
+    file was added, removed or modified the merged Template is returned as is,
+    otherwise only files whose content changed are read again. Entries are
+    stored as json, loading one never runs code.
+    '''
+
+    def __init__(self, directory=None):
+
+        if directory is None:
+            directory = os.path.join(defaultdirectory(), 'templates')
+        self.directory = directory
+        self.suffix = '-' + __version__ + '.' + str(ckl.Template.FORMAT) + '.json'
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, templatedir):
+        '''Return the merged Template of every template file in templatedir.'''
+
+        templatedir = os.path.abspath(templatedir)
+        path = os.path.join(self.directory, hashlib.sha256(
+            templatedir.encode('UTF-8')).hexdigest() + self.suffix)
+        entry = self.get(path)
+
+        # lists, not tuples, so the manifest compares equal after a json round trip
+        manifest = []
+        for filename in ckl.findtemplates(templatedir):
+            stat = os.stat(filename)
+            manifest.append([os.path.relpath(filename, templatedir),
+                             stat.st_mtime_ns, stat.st_size])
+
+        # nothing added, removed or modified
+        if entry is not None and entry['manifest'] == manifest:
+            stats.count('template_cache_hits')
+            return entry['merged']
+
+        # read files again only if their content changed
+        files = {}
+        merged = ckl.Template()
+        for relpath, mtime, size in manifest:
+            filename = os.path.join(templatedir, relpath)
+            old = entry['files'].get(relpath) if entry else None
+            if old is not None and old['signature'] == [mtime, size]:
+                layer = old
+            else:
+                digest = filedigest(filename)
+                if old is not None and old['digest'] == digest:
+                    layer = dict(old, signature=[mtime, size])
+                else:
+                    layer = {'signature': [mtime, size], 'digest': digest,
+                             'template': ckl.loadtemplate(filename)}
+            files[relpath] = layer
+            merged.update(layer['template'])
+
+        self.put(path, {'manifest': manifest, 'files': files, 'merged': merged})
+        return merged
+
+    def get(self, path):
+        '''Return the entry cached at path, or None.'''
+
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(f.read().decode('UTF-8'))
+            entry['merged'] = ckl.templatefromdata(entry['merged'], path)
+            for layer in entry['files'].values():
+                layer['template'] = ckl.templatefromdata(layer['template'], path)
+            return entry
+        except FileNotFoundError:
+            return None
+
+        # treat unreadable entries as missing
+        except (OSError, KeyError, TypeError, AttributeError, ValueError):
+            return None
+
+    def put(self, path, entry):
+        '''Store entry at path, entries of other versions are removed.'''
+
+        for name in os.listdir(self.directory):
+            if name.endswith(('.pickle', '.json')) and not name.endswith(self.suffix):
+                removefile(os.path.join(self.directory, name))
+
+        data = dict(entry, merged=entry['merged'].todata(), files=dict(
+            (relpath, dict(layer, template=layer['template'].todata()))
+            for relpath, layer in entry['files'].items()))
+
+        # write to a temp file first so concurrent runs never see partial entries
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(data, ensure_ascii=False,
+                                   separators=(',', ':')).encode('UTF-8'))
+            os.replace(tmppath, path)
+        except OSError:
+            removefile(tmppath)
+
+
+def loadtemplatelayers(directories, filenames, cache=None):
+    '''
+    Return a Template merging template directories, then template files.
+
+    directories should be a list of directories (see findtemplates())
+    filenames should be a list of template filenames
+    cache may be an XccdfCache object, template directories are then loaded
+    through a TemplateCache in its templates subdirectory
+    '''
+
+    templatecache = None
+    if cache is not None:
+        templatecache = TemplateCache(os.path.join(cache.directory, 'templates'))
+
+    template = ckl.Template()
+    for directory in directories:
+        if templatecache is not None:
+            template.update(templatecache.load(directory))
+        else:
+            template.update(ckl.loadtemplates(ckl.findtemplates(directory)))
+    template.update(ckl.loadtemplates(filenames))
+    return template
+
+
+def defaultdirectory():
+    '''Return the default cache directory.'''
+
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'genckl')
+
+
+def isprivate(st):
+    '''
+    Return True if a file or directory can only be written by the current user.
+
+    st should be the os.stat_result of the file or directory, its owner should
+    be the current user and it should not be group or world writable. There
+    are no user ids to check on Windows, True is returned there.
+    '''
+
+    if not hasattr(os, 'getuid'):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def tobytes(data):
+    '''Return data as bytes, text is encoded as UTF-8.'''
+
+    if isinstance(data, str):
+        return data.encode('UTF-8')
+    return data
+
+
+def filedigest(filename):
+    '''Return the SHA-256 hex digest of a file.'''
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        chunk = f.read(1024*1024)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(1024*1024)
+    return digest.hexdigest()
+
+
+def removefile(path):
+    '''Remove path, ignoring errors.'''
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
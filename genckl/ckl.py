@@ -1,20 +1,106 @@
 import os
+import io
+import sys
 import uuid
+import itertools
+import collections.abc
 import zipfile
+import fnmatch
+import functools
+import multiprocessing
+import concurrent.futures
 import csv
+import gzip
+import lzma
+import json
 import subprocess
 import shlex
 import socket
+import struct
+import threading
+import time
 from xml.etree import ElementTree
-from xml.dom import minidom
+from xml.sax.saxutils import escape
+from . import stats
+
+# yaml templates need PyYAML, every other template format works without it
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# zstd output needs python 3.14 (compression.zstd) or the zstandard module
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# fcntl is only used to read interface addresses, it is not available everywhere
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# line breaks other than "\n" that end up as "\n" in a written checklist
+LINE_BREAKS = str.maketrans({'\r': '\n', '\x85': '\n', '\u2028': '\n',
+                             '\u2029': '\n'})
+
+# namespaces of the parts of an ARF report that are read (see ArfTarget)
+XCCDF_NS = 'http://checklists.nist.gov/xccdf/'
+SCAP_NS = 'http://scap.nist.gov/schema/'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+AI_NS = 'http://scap.nist.gov/schema/asset-identification/1.1'
+
+# output compressions: (filename suffix, default level, minimum level,
+# maximum level)
+COMPRESSIONS = {'gzip': ('.gz', 6, 0, 9), 'xz': ('.xz', 6, 0, 9),
+                'zstd': ('.zst', 3, 1, 22)}
+
+# checklist formats, STIG Viewer 2 XML and STIG Viewer 3 JSON
+FORMATS = ('ckl', 'cklb')
+
+# cklb target data keys and the checklist asset data they hold
+CKLB_TARGET_DATA = (('target_type', 'ASSET_TYPE'), ('host_name', 'HOST_NAME'),
+                    ('ip_address', 'HOST_IP'), ('mac_address', 'HOST_MAC'),
+                    ('fqdn', 'HOST_FQDN'), ('comments', 'TARGET_COMMENT'),
+                    ('role', 'ROLE'), ('technology_area', 'TECH_AREA'),
+                    ('target_key', 'TARGET_KEY'),
+                    ('web_db_site', 'WEB_DB_SITE'),
+                    ('web_db_instance', 'WEB_DB_INSTANCE'))
+
+# template files found in template directories (see findtemplates())
+TEMPLATE_EXTENSIONS = ('.csv', '.yaml', '.yml', '.json', '.cklt')
+
+# linux network interface flags, route flags and ioctl used by
+# primaryinterface()
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+RTF_UP = 0x1
+SIOCGIFADDR = 0x8915
 
 
 class Ckl():
     '''Create a new Ckl object.'''
 
+    # vuln attributes indexed for findvulns(), CCI references are indexed too
+    INDEX_ATTRS = ('Vuln_Num', 'Rule_ID', 'Rule_Ver', 'Severity')
+
     def __init__(self):
 
         self.xccdfs = []
+
+        # each index maps a value to an insertion ordered dict of Vulns (used
+        # as a set, so Vulns are removed in constant time). The status index
+        # is built on first use and dropped when results are merged.
+        self.indexes = {}
+        for name in Ckl.INDEX_ATTRS + ('CCI_REF',):
+            self.indexes[name] = {}
+        self.statusindex = None
+
+        self.cmdoutputs = {}
         self.asset = {'ROLE': 'None',
                       'ASSET_TYPE': 'Computing',
                       'HOST_NAME': '',
@@ -28,54 +114,105 @@ class Ckl():
                       'WEB_DB_SITE': '',
                       'WEB_DB_INSTANCE': ''}
 
-    def write(self, filename):
-        '''Write this Ckl to a file.'''
+    @stats.timed('write')
+    def write(self, filename, compression=None, level=None, fmt='ckl'):
+        '''
+        Write this Ckl to a file.
 
-        # flatten the Ckl prior to writing
-        self.flatten()
+        compression and level are passed on to openoutput()
+        fmt should be one of FORMATS, "ckl" (STIG Viewer 2 XML) or "cklb"
+        (STIG Viewer 3 JSON)
 
-        # setup new ElementTree
-        tree = ElementTree.ElementTree(ElementTree.Element('CHECKLIST'))
-        asset_el = ElementTree.SubElement(tree.getroot(), 'ASSET')
-        stigs_el = ElementTree.SubElement(tree.getroot(), 'STIGS')
+        The checklist is written one STIG_INFO/VULN (or rule) at a time in the
+        same layout STIG Viewer uses, without building the whole document.
+        Compressed output is compressed as it is written.
+        '''
 
-        # add asset SubElements
-        for name, value in self.asset.items():
-            sub_el = ElementTree.SubElement(asset_el, name)
-            sub_el.text = value
+        if fmt not in FORMATS:
+            raise ValueError('unknown checklist format ' + str(fmt))
 
-        # add each stig
+        # flatten the Ckl prior to writing, parse every rule description up
+        # front so a malformed one fails before the output file is created
+        self.flatten()
         for xccdf in self.xccdfs:
-            stigs_el.append(xccdf.toelement())
+            xccdf.parsedescriptions()
+
+        output_file = openoutput(filename, compression, level)
+        if stats.enabled:
+            output_file = stats.CountingWriter(output_file, 'bytes_written')
+
+        if fmt == 'cklb':
+            self._writecklb(output_file)
+        else:
+            self._writeckl(output_file)
+        output_file.close()
 
-        # convert ElementTree to a DOM
-        dom = minidom.parseString(ElementTree.tostring(
-            tree.getroot(), encoding='unicode'))
+    def _writeckl(self, output_file):
+        '''Write this Ckl to an open file in ckl (XML) format.'''
 
-        # make the DOM pretty
-        dom = dom.toprettyxml()
+        # setup asset Element
+        asset_el = ElementTree.Element('ASSET')
+        for name, value in self.asset.items():
+            sub_el = ElementTree.SubElement(asset_el, name)
+            sub_el.text = value
 
-        # convert the DOM back to an ElementTree
-        tree = ElementTree.ElementTree(ElementTree.fromstring(dom))
+        # write the XML declaration and stig viewer comment lines first, python's
+        # ElementTree lib doesn't support comments before the first Element
+        output_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        output_file.write('<!--DISA STIG Viewer :: 2.11-->\n')
+        output_file.write('<CHECKLIST>\n')
+        writeelement(output_file, asset_el, 1)
+
+        # write each stig, an empty STIGS Element is written on a single line
+        if self.xccdfs:
+            output_file.write('\t<STIGS>\n')
+            for xccdf in self.xccdfs:
+                output_file.write('\t\t<iSTIG>\n')
+                writeelement(output_file, xccdf.infoelement(), 3)
+                for vuln in xccdf.getvulns():
+                    writeelement(output_file, vuln.toelement(), 3)
+                output_file.write('\t\t</iSTIG>\n')
+            output_file.write('\t</STIGS>\n')
+        else:
+            output_file.write('\t<STIGS></STIGS>\n')
 
-        # convert the ElementTree to a list of lines
-        lines = ElementTree.tostring(
-            tree.getroot(), encoding='unicode', short_empty_elements=False).splitlines()
+        output_file.write('</CHECKLIST>')
 
-        # insert the XML declaration and stig viewer comment lines into the list
-        # we have to do it this way because python's ElementTree lib doesn't
-        # support comments before the first Element
-        lines.insert(0, '<!--DISA STIG Viewer :: 2.11-->')
-        lines.insert(0, '<?xml version="1.0" encoding="UTF-8"?>')
+    def _writecklb(self, output_file):
+        '''
+        Write this Ckl to an open file in cklb (JSON) format.
 
-        # try to open, if TypeError assume already open
-        try:
-            output_file = open(filename, 'w', encoding='UTF-8')
-        except TypeError:
-            output_file = filename
+        The document is written as compact JSON, one rule object at a time,
+        only a single rule is held as a dictionary at any time.
+        '''
 
-        output_file.write('\n'.join(lines))
-        output_file.close()
+        def dump(value):
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+        target_data = {}
+        for key, name in CKLB_TARGET_DATA:
+            target_data[key] = self.asset.get(name) or ''
+        target_data['is_web_database'] = \
+            self.asset.get('WEB_OR_DATABASE') == 'true'
+
+        output_file.write('{"title":' + dump(self.asset.get('HOST_NAME') or '') +
+                          ',"id":' + dump(str(uuid.uuid4())) + ',"stigs":[')
+        for count, xccdf in enumerate(self.xccdfs):
+            if count:
+                output_file.write(',')
+            stig = xccdf.tostig()
+
+            # the stig object is written up to its rules list
+            output_file.write(dump(stig)[:-1] + ',"rules":[')
+            for vulncount, vuln in enumerate(xccdf.getvulns()):
+                if vulncount:
+                    output_file.write(',')
+                output_file.write(dump(vuln.torule()))
+            output_file.write(']}')
+
+        output_file.write('],"active":false,"mode":1,"has_path":true,' +
+                          '"target_data":' + dump(target_data) +
+                          ',"cklb_version":"1.0"}')
 
     def importxccdf(self, xccdf):
         '''
@@ -91,8 +228,15 @@ class Ckl():
             if myxccdf.getid() == xccdf.getid():
                 return False
 
-        # add the stig
+        # add the stig, index its vulns
         self.xccdfs.append(xccdf)
+        for vuln in xccdf.getvulns():
+            self._indexvuln(vuln)
+
+        # fill in asset data the checklist doesn't have yet from the scan
+        for name, value in xccdf.asset.items():
+            if not self.asset.get(name):
+                self.asset[name] = value
 
         # set target_key if it hasn't been set yet, this is not a bug. As
         # of STIG Viewer 2.11, it does no additional checks (like ensuring new
@@ -103,6 +247,7 @@ class Ckl():
 
         return True
 
+    @stats.timed('flatten')
     def flatten(self):
         '''
         Merges all result xccdfs with non-result xccdfs in this Ckl. Result 
@@ -120,121 +265,256 @@ class Ckl():
             if not xccdf.hasresults:
                 plain_xccdfs.append(xccdf)
 
+        # index each non-result xccdf once, not once per result xccdf
+        indexes = []
+        for pl_xccdf in plain_xccdfs:
+            indexes.append(pl_xccdf.mergeindex())
+
         for res_xccdf in result_xccdfs:
 
-            # attempt to merge results with all non-result xccdfs, collect list
+            # attempt to merge results with all non-result xccdfs, collect set
             # of successfully merged vulns
-            merged_vulns = []
-            for pl_xccdf in plain_xccdfs:
-                merged_vulns = merged_vulns + pl_xccdf.mergexccdf(res_xccdf)
+            merged_vulns = set()
+            for pl_xccdf, index in zip(plain_xccdfs, indexes):
+                merged_vulns.update(pl_xccdf.mergexccdf(res_xccdf, index))
+
+            # remove the merged vulns from the result xccdf and the index
+            if merged_vulns:
+                stats.count('vulns_merged', len(merged_vulns))
+                res_xccdf.vulns[:] = [
+                    vuln for vuln in res_xccdf.vulns if vuln not in merged_vulns]
+                for vuln in merged_vulns:
+                    self._unindexvuln(vuln)
 
-            # remove the merged vulns from the result xccdf
-            for vuln in merged_vulns:
-                if vuln in res_xccdf.vulns:
-                    res_xccdf.vulns.remove(vuln)
+                # merged results changed the status of other vulns
+                self.statusindex = None
 
             # if there are any vulns left in the result xccdf, append to plain list
             if res_xccdf.vulns:
                 plain_xccdfs.append(res_xccdf)
+                indexes.append(res_xccdf.mergeindex())
 
         # set our xccdfs to the remaining ones in the plain list
         self.xccdfs = plain_xccdfs
 
-    def addtemplate(self, filename, runcmds=False):
+    @stats.timed('template')
+    def addtemplate(self, template, runcmds=False, timeout=None):
         '''
         Adds and applies a ckl template to this Ckl.
 
-        filename should be csv filename 
+        template should be a template filename (see loadtemplate()) or a
+        Template object
+        timeout should be the template command timeout in seconds, or None
+
+        Template command output is memoized in cmdoutputs, each distinct
+        command is run once per Ckl (see runtemplatecmds()).
         '''
 
         # flatten the Ckl prior to adding template
         self.flatten()
+        if not isinstance(template, Template):
+            template = loadtemplate(template)
+
+        # process each vuln template, looking up matching vulns
+        rows = 0
+        for vulnid, values in template.rows.items():
+            vulns = self.getvulnsbyid(vulnid)
+            if not vulns:
+                continue
+            rows = rows + 1
+            status, details, comments, sevover, justification = values
+
+            # template commands are run once per row, not once per vuln
+            if runcmds and details is not None:
+                details = runinlinecmds(
+                    details, outputs=self.cmdoutputs, timeout=timeout)
+            if runcmds and comments is not None:
+                comments = runinlinecmds(
+                    comments, outputs=self.cmdoutputs, timeout=timeout)
+
+            # values are normalized already, None leaves a vuln untouched.
+            # Command output is set even when empty
+            for vuln in vulns:
+                if status:
+                    self.setstatus(vuln, status)
+                if details is not None:
+                    vuln.finding_details = details
+                if comments is not None:
+                    vuln.comments = comments
+                if sevover:
+                    vuln.severity_override = sevover
+                if justification:
+                    vuln.severity_justification = justification
+
+        stats.count('template_rows', rows)
+
+    def runtemplatecmds(self, filenames, jobs=4, timeout=None):
+        '''
+        Run the template commands of several templates ahead of addtemplate().
+
+        filenames should be a list of template filenames or Template objects
+        jobs should be the number of commands run at the same time
+        timeout should be the template command timeout in seconds, or None
+
+        Commands are collected from every template row matching a Vuln in this
+        Ckl, duplicates are run once. Output is stored in cmdoutputs, where
+        addtemplate() picks it up in row order.
+        '''
+
+        # flatten the Ckl prior to collecting commands
+        self.flatten()
+
+        cmds = []
+        for template in filenames:
+            if not isinstance(template, Template):
+                template = loadtemplate(template)
+            for vulnid, values in template.rows.items():
+                if self.getvulnsbyid(vulnid):
+                    for value in values[1:3]:
+                        if value:
+                            cmds.extend(findinlinecmds(value))
+
+        cmds = [cmd for cmd in cmds if cmd not in self.cmdoutputs]
+        self.cmdoutputs.update(runcmds(cmds, jobs, timeout))
+
+    def getvulnsbyid(self, vulnid):
+        '''
+        Return a list of Vuln objects in this Ckl with the given ID.
+
+        The lookup uses an index kept up to date by importxccdf() and
+        flatten(), Xccdfs should not be added to or removed from this Ckl
+        directly.
+        '''
+
+        return list(self.indexes['Vuln_Num'].get(vulnid, ()))
+
+    def findvulns(self, vulnnum=None, ruleid=None, rulever=None, cci=None,
+                  severity=None, status=None):
+        '''
+        Return an iterator of the Vuln objects in this Ckl matching all of the
+        given values.
+
+        vulnnum, ruleid, rulever should be a Vuln_Num, Rule_ID, Rule_Ver
+        cci should be a CCI reference ("CCI-000366")
+        severity should be a Severity (Vuln.SEVERITY_CAT_I, etc.), severity
+        overrides are not taken into account
+        status should be a status (Vuln.STATUS_OPEN, etc.)
+
+        With no values given every Vuln is returned, in checklist order.
+        Otherwise Vulns are looked up in indexes, starting with the smallest
+        match, and yielded as they are found, in the order they were indexed
+        (not necessarily checklist order). Like getvulnsbyid(), Xccdfs should
+        only be changed through this Ckl, statuses through setstatus().
+        Results are not merged by this method, flatten() first to look up
+        results.
+        '''
+
+        criteria = [('Vuln_Num', vulnnum), ('Rule_ID', ruleid),
+                    ('Rule_Ver', rulever), ('CCI_REF', cci),
+                    ('Severity', severity)]
+        matches = [self.indexes[name].get(value, {})
+                   for name, value in criteria if value is not None]
+        if status is not None:
+            matches.append(self.getstatusindex().get(status, {}))
+
+        if not matches:
+            return self.itervulns()
+
+        matches.sort(key=len)
+        return (vuln for vuln in list(matches[0])
+                if all(vuln in match for match in matches[1:]))
+
+    def itervulns(self):
+        '''Return an iterator of every Vuln object in this Ckl, in order.'''
 
-        # get list of all of our vulns
-        vulns = []
         for xccdf in self.xccdfs:
-            vulns.extend(xccdf.getvulns())
+            for vuln in xccdf.getvulns():
+                yield vuln
+
+    def setstatus(self, vuln, status):
+        '''
+        Set the status of a Vuln in this Ckl, keeping the status index current.
 
-        # open file and read lines
-        with open(filename) as f:
-            csvlines = f.readlines()
+        vuln should be a Vuln object in this Ckl
+        status should be a status (Vuln.STATUS_OPEN, etc.)
+        '''
 
-        # clean first line as it's used for dictionary keys
-        csvlines[0] = csvlines[0].replace(' ', '').lower()
+        if self.statusindex is not None:
+            self.statusindex.get(vuln.status, {}).pop(vuln, None)
+            self.statusindex.setdefault(status, {})[vuln] = None
+        vuln.status = status
+
+    def getstatusindex(self):
+        '''Return the status index, building it if needed.'''
+
+        if self.statusindex is None:
+            self.statusindex = {}
+            for vuln in self.itervulns():
+                self.statusindex.setdefault(vuln.status, {})[vuln] = None
+        return self.statusindex
+
+    def _indexvuln(self, vuln):
+        '''Add a Vuln to the indexes.'''
+
+        for name in Ckl.INDEX_ATTRS:
+            value = vuln.values[Vuln.ATTR_INDEX[name]]
+            self.indexes[name].setdefault(value, {})[vuln] = None
+        for cci in vuln.cci_refs:
+            self.indexes['CCI_REF'].setdefault(cci, {})[vuln] = None
+        if self.statusindex is not None:
+            self.statusindex.setdefault(vuln.status, {})[vuln] = None
+
+    def _unindexvuln(self, vuln):
+        '''Remove a Vuln from the indexes.'''
+
+        for name in Ckl.INDEX_ATTRS:
+            value = vuln.values[Vuln.ATTR_INDEX[name]]
+            self._unindex(self.indexes[name], value, vuln)
+        for cci in vuln.cci_refs:
+            self._unindex(self.indexes['CCI_REF'], cci, vuln)
+        if self.statusindex is not None:
+            self._unindex(self.statusindex, vuln.status, vuln)
+
+    def _unindex(self, index, value, vuln):
+
+        vulns = index.get(value)
+        if vulns is not None:
+            vulns.pop(vuln, None)
+            if not vulns:
+                del index[value]
+
+    @stats.timed('hostdata')
+    def sethostdata(self, hostdata=None, timeout=2.0):
+        '''
+        Set this Ckl's host data from the local host.
 
-        # parse and process each vuln template
-        reader = csv.DictReader(csvlines)
-        for vulntemp in reader:
-            for vuln in vulns:
-                if vulntemp['id'] == vuln.getid():
-
-                    # set status
-                    status = vulntemp.get(
-                        'status', '').replace(' ', '').lower()
-                    if status == 'notreviewed':
-                        vuln.status = Vuln.STATUS_NOT_REVIEWED
-                    elif status == 'open':
-                        vuln.status = Vuln.STATUS_OPEN
-                    elif status == 'notafinding':
-                        vuln.status = Vuln.STATUS_NOT_A_FINDING
-                    elif status == 'notapplicable':
-                        vuln.status = Vuln.STATUS_NOT_APPLICABLE
-
-                    # set finding details
-                    if vulntemp.get('findingdetails'):
-                        if runcmds:
-                            vulntemp['findingdetails'] = runinlinecmds(
-                                vulntemp['findingdetails'])
-                        vuln.finding_details = vulntemp['findingdetails']
-
-                    # set comments
-                    if vulntemp.get('comments'):
-                        if runcmds:
-                            vulntemp['comments'] = runinlinecmds(
-                                vulntemp['comments'])
-                        vuln.comments = vulntemp['comments']
-
-                    # set severity override
-                    sevover = vulntemp.get(
-                        'severityoverride', '').replace(' ', '').lower()
-                    if sevover == 'cati' or sevover == 'cat1':
-                        vuln.severity_override = Vuln.SEVERITY_CAT_I
-                    elif sevover == 'catii' or sevover == 'cat2':
-                        vuln.severity_override = Vuln.SEVERITY_CAT_II
-                    elif sevover == 'catiii' or sevover == 'cat3':
-                        vuln.severity_override = Vuln.SEVERITY_CAT_III
-
-                    # set severity override justification
-                    if vulntemp.get('severityoverridejustification'):
-                        vuln.severity_justification = vulntemp['severityoverridejustification']
-
-    def sethostdata(self):
-        '''Set this Ckl's host data from the local host.'''
-
-        self.asset['HOST_NAME'] = socket.gethostname()
-        self.asset['HOST_FQDN'] = socket.getfqdn()
-        self.asset['HOST_IP'] = socket.gethostbyname(self.asset['HOST_NAME'])
-        rawmac = str(hex(uuid.getnode()))[2:].upper()
-        mac = ''
-        for i in range(6):
-            mac = mac + '-' + rawmac[i*2:(i*2)+2]
-        self.asset['HOST_MAC'] = mac[1:]
+        hostdata may be a dictionary returned by gethostdata(), for host data
+        gathered ahead of time (see Background), otherwise it is gathered now
+        timeout is passed on to gethostdata() when host data is gathered now
+        '''
+
+        if hostdata is None:
+            hostdata = gethostdata(timeout)
+        self.asset.update(hostdata)
 
 
 class Xccdf():
     '''
     This class represents a set of xccdf data.
 
-    source is a filename or file object containing XML data in xccdf format
+    source is a filename or file object containing XML data in xccdf format, or
+    None for an empty Xccdf (see readckl())
+    stream enables incremental parsing, each Group element is discarded as soon
+    as its Vuln is built so memory use stays bounded on large documents. The
+    resulting Xccdf is identical to one built without streaming.
     '''
 
-    def __init__(self, source):
+    # header elements (children of the root Benchmark) used to build attrs
+    HEADER_TAGS = ['version', 'description',
+                   'plain-text', 'title', 'notice', 'reference']
 
-        # try to open, assume already open if wrong type
-        try:
-            xml = open(source)
-        except TypeError:
-            xml = source
+    @stats.timed('parse')
+    def __init__(self, source, stream=False):
 
         # setup instance vars
         self.attrs = {}
@@ -243,13 +523,35 @@ class Xccdf():
         self.hasresults = False
         self.results_tool = ''
         self.results_time = ''
+        self.ns = None
+
+        # checklist asset data of the scanned host, only found in ARF reports
+        self.asset = {}
+
+        # nothing to parse, attrs and vulns are filled in by the caller
+        if source is None:
+            return
+
+        # try to open, assume already open if wrong type
+        try:
+            xml = open(source)
+        except TypeError:
+            xml = source
 
         # parse the xml data, close the xml
-        tree = ElementTree.parse(xml)
+        if stream:
+            self._iterparse(xml)
+        else:
+            self._parse(xml)
         xml.close()
+        stats.count('vulns_parsed', len(self.vulns))
+
+    def _parse(self, xml):
+        '''Build this Xccdf from a fully loaded ElementTree of xml.'''
+
+        tree = ElementTree.parse(xml)
 
         # setup xml namespace with default tag d, this is ugly, needfix
-        self.ns = None
         if tree.getroot().tag[0] == '{':
             self.ns = {'d': tree.getroot().tag.split('}')[0][1:]}
             for e in tree.iter():
@@ -258,42 +560,143 @@ class Xccdf():
                     break
 
         # build attrs dictionary
-        self.attrs['version'] = tree.find('d:version', self.ns).text
-        # NEEDFIX dont know where this value is coming from see ckl file
-        self.attrs['classification'] = ''
-        self.attrs['customname'] = ''
-        self.attrs['stigid'] = tree.getroot().get('id')
-        self.attrs['description'] = tree.find('d:description', self.ns).text
-        self.attrs['filename'] = os.path.basename(xml.name)
-        self.attrs['releaseinfo'] = tree.find('d:plain-text', self.ns).text
-        self.attrs['title'] = tree.find('d:title', self.ns).text
-
-        # this is not a bug, within ckl all vulns have same uuid (the xccdf uuid),
-        # but "STIG_INFO" uuid differs, open a ckl as text and see for yourself...
-        self.attrs['uuid'] = str(uuid.uuid4())
-
-        self.attrs['notice'] = tree.find('d:notice', self.ns).get('id')
-        self.attrs['source'] = tree.find(
-            'd:reference', self.ns).find('dc:source', self.ns).text
-
-        # get result info (if any), set that we have results
-        if tree.find('d:TestResult', self.ns):
-            testresult_el = tree.find('d:TestResult', self.ns)
+        header = {}
+        for name in Xccdf.HEADER_TAGS:
+            header[name] = tree.find('d:' + name, self.ns)
+        self._setattrs(tree.getroot(), header, xml.name)
+
+        # get result info (if any), set that we have results, index the result
+        # elements by rule id so each vuln lookup is a single dict access. If
+        # a rule has several results the last one wins, same as a linear scan.
+        results = {}
+        testresult_el = tree.find('d:TestResult', self.ns)
+        if testresult_el:
             self.results_tool = testresult_el.get('test-system')
             self.results_time = testresult_el.get('start-time')
             self.hasresults = True
+            for result_el in testresult_el.findall('d:rule-result', self.ns):
+                results[result_el.get('idref')] = result_el
 
         # add the vulns
+        matched = 0
         for vuln_el in tree.findall('d:Group', self.ns):
+            result = results.get(vuln_el.find('d:Rule', self.ns).get('id'))
+            if result is not None:
+                matched = matched + 1
+            self.vulns.append(Vuln(vuln_el, self, result, self.ns))
+        stats.count('results_matched', matched)
 
-            # check if any result elements apply to this vuln
-            result = None
-            if self.hasresults:
-                for result_el in tree.find('d:TestResult', self.ns).findall('d:rule-result', self.ns):
-                    if vuln_el.find('d:Rule', self.ns).get('id') == result_el.get('idref'):
-                        result = result_el
+    def _iterparse(self, xml):
+        '''
+        Build this Xccdf from xml one element at a time.
 
-            self.vulns.append(Vuln(vuln_el, self, result, self.ns))
+        Only the header elements, the Group currently being read and the
+        result strings are kept, everything else is cleared as soon as it has
+        been read. The header elements must precede the first Group, as they
+        do in DISA benchmarks.
+        '''
+
+        root = None
+        top = None
+        testresult_el = None
+        header = {}
+        results = {}
+        prefix = ''
+        depth = 0
+
+        for event, elem in ElementTree.iterparse(xml, events=('start', 'end')):
+
+            # track depth, root element and current child of the root
+            if event == 'start':
+                depth = depth + 1
+                if depth == 1:
+                    root = elem
+                    # setup xml namespace with default tag d, same as _parse
+                    if elem.tag[0] == '{':
+                        self.ns = {'d': elem.tag.split('}')[0][1:]}
+                        prefix = '{' + self.ns['d'] + '}'
+                elif depth == 2:
+                    top = elem
+                    if testresult_el is None and elem.tag == prefix + 'TestResult':
+                        testresult_el = elem
+                elif depth == 3 and top is testresult_el and not self.hasresults:
+                    # only a TestResult with children counts as results
+                    self.results_tool = testresult_el.get('test-system')
+                    self.results_time = testresult_el.get('start-time')
+                    self.hasresults = True
+                if self.ns and 'dc' not in self.ns and elem.tag[-6:] == 'source':
+                    self.ns['dc'] = elem.tag.split('}')[0][1:]
+                continue
+
+            depth = depth - 1
+
+            # a child of the root has been read completely
+            if depth == 1:
+                name = elem.tag[len(prefix):]
+                if name == 'Group':
+                    if not self.attrs:
+                        self._setattrs(root, header, xml.name)
+                    self.vulns.append(Vuln(elem, self, None, self.ns))
+                elif name in Xccdf.HEADER_TAGS and name not in header:
+                    header[name] = elem
+                    continue
+                root.remove(elem)
+                elem.clear()
+
+            # keep the result of each rule-result, last one wins
+            elif depth == 2 and top is testresult_el and \
+                    elem.tag == prefix + 'rule-result':
+                result = None
+                if elem:
+                    result = elem.find('d:result', self.ns).text
+                results[elem.get('idref')] = result
+                testresult_el.remove(elem)
+                elem.clear()
+
+            # drop content of elements we never look at
+            elif depth > 1 and top.tag not in (prefix + 'Group', prefix + 'reference') \
+                    and top is not testresult_el:
+                elem.clear()
+
+        # no Groups found, attrs may not be set yet
+        if not self.attrs:
+            self._setattrs(root, header, xml.name)
+
+        # results may follow the Groups, apply them now
+        matched = 0
+        for vuln in self.vulns:
+            result = results.get(vuln.attrs['Rule_ID'])
+            if result is not None:
+                matched = matched + 1
+                vuln.setresult(result)
+        stats.count('results_matched', matched)
+
+    def _setattrs(self, root, header, filename):
+        '''
+        Build the attrs dictionary.
+
+        root should be the root Element
+        header should be a dictionary of header Elements keyed by tag name
+        filename should be the name of the xccdf source
+        '''
+
+        self.attrs['version'] = header.get('version').text
+        # NEEDFIX dont know where this value is coming from see ckl file
+        self.attrs['classification'] = ''
+        self.attrs['customname'] = ''
+        self.attrs['stigid'] = root.get('id')
+        self.attrs['description'] = header.get('description').text
+        self.attrs['filename'] = os.path.basename(filename)
+        self.attrs['releaseinfo'] = header.get('plain-text').text
+        self.attrs['title'] = header.get('title').text
+
+        # this is not a bug, within ckl all vulns have same uuid (the xccdf uuid),
+        # but "STIG_INFO" uuid differs, open a ckl as text and see for yourself...
+        self.attrs['uuid'] = str(uuid.uuid4())
+
+        self.attrs['notice'] = header.get('notice').get('id')
+        self.attrs['source'] = header.get(
+            'reference').find('dc:source', self.ns).text
 
     def getattrs(self):
         '''
@@ -342,18 +745,15 @@ class Xccdf():
 
         return self.uuid
 
-    def toelement(self):
+    def infoelement(self):
         '''
-        Return an Element object representing this Xccdf.
+        Return an Element object containing this Xccdf's attributes.
 
-        Returns Element object (tag: iSTIG)
+        Returns Element object (tag: STIG_INFO)
         '''
 
-        # create iSTIG Element, this is the root element for this stig
-        istig_el = ElementTree.Element('iSTIG')
-
         # add STIG_INFO Element, and subelements
-        stig_info_el = ElementTree.SubElement(istig_el, 'STIG_INFO')
+        stig_info_el = ElementTree.Element('STIG_INFO')
         for name, value in self.attrs.items():
             si_data_el = ElementTree.SubElement(stig_info_el, 'SI_DATA')
             sid_name_el = ElementTree.SubElement(si_data_el, 'SID_NAME')
@@ -362,6 +762,66 @@ class Xccdf():
                 sid_data_el = ElementTree.SubElement(si_data_el, 'SID_DATA')
                 sid_data_el.text = value
 
+        return stig_info_el
+
+    def tostig(self):
+        '''
+        Return a dictionary of this Xccdf's attributes as a cklb stig object.
+
+        The "rules" list is left out, see Ckl.write(). The stig uuid is the
+        STIG_UUID every rule refers to in "stig_uuid", cklb has no separate
+        STIG_INFO uuid.
+        '''
+
+        targetkey = ''
+        if self.vulns:
+            targetkey = self.vulns[0].attrs['TargetKey'] or ''
+        return {'stig_name': self.attrs.get('title') or '',
+                'display_name': self.attrs.get('title') or '',
+                'stig_id': self.attrs.get('stigid') or '',
+                'release_info': self.attrs.get('releaseinfo') or '',
+                'version': self.attrs.get('version') or '',
+                'uuid': self.uuid,
+                'reference_identifier': targetkey,
+                'size': len(self.vulns)}
+
+    def parsedescriptions(self):
+        '''
+        Parse the rule descriptions of all Vulns in this Xccdf now.
+
+        Vuln descriptions are otherwise parsed on first use, do this before
+        sharing an Xccdf (pickling, copying) so it is only done once.
+        '''
+
+        for vuln in self.vulns:
+            vuln.parsedescription()
+
+    def newuuids(self):
+        '''
+        Give this Xccdf and its Vulns new uuids.
+
+        Used when a parsed Xccdf is reused for another checklist, every
+        checklist should have its own uuids.
+        '''
+
+        self.uuid = str(uuid.uuid4())
+        self.attrs['uuid'] = str(uuid.uuid4())
+        for vuln in self.vulns:
+            vuln.attrs['STIG_UUID'] = self.uuid
+
+    def toelement(self):
+        '''
+        Return an Element object representing this Xccdf.
+
+        Returns Element object (tag: iSTIG)
+        '''
+
+        # create iSTIG Element, this is the root element for this stig
+        istig_el = ElementTree.Element('iSTIG')
+
+        # add STIG_INFO Element
+        istig_el.append(self.infoelement())
+
         # add each vuln
         for vuln in self.vulns:
             istig_el.append(vuln.toelement())
@@ -369,30 +829,40 @@ class Xccdf():
         # return the root xml Element
         return istig_el
 
-    def mergexccdf(self, xccdf):
+    def mergeindex(self):
+        '''
+        Return a dictionary used to match Vulns when merging results.
+
+        Keys are Vuln merge keys (see Vuln.getmergekey()), values are lists of
+        this Xccdf's Vuln objects with that key, in order.
+        '''
+
+        index = {}
+        for vuln in self.vulns:
+            index.setdefault(vuln.getmergekey(), []).append(vuln)
+        return index
+
+    def mergexccdf(self, xccdf, index=None):
         '''
         Merge xccdf results from another Xccdf object.
 
+        index may be a dictionary from mergeindex(), if not given it is built
+
         Returns list of Vuln objects that were imported, or an empty list.
         '''
 
+        if index is None:
+            index = self.mergeindex()
+
         imports = []
 
         for vuln in xccdf.getvulns():
-            imported = False
-            chkstr = vuln.attrs.get('Group_Title') + vuln.attrs.get('Rule_Ver')
 
-            # attempt to match and import
-            for myvuln in self.vulns:
-                mychkstr = myvuln.attrs.get(
-                    'Group_Title') + myvuln.attrs.get('Rule_Ver')
-
-                # if matches, import results, set imported
-                if chkstr == mychkstr:
+            # import results into every matching vuln
+            myvulns = index.get(vuln.getmergekey())
+            if myvulns:
+                for myvuln in myvulns:
                     myvuln.importresult(vuln)
-                    imported = True
-
-            if imported:
                 imports.append(vuln)
 
         return imports
@@ -402,7 +872,8 @@ class Vuln():
     '''
     This class represents a single vulnerability.
 
-    element should be the xml Element object to parse
+    element should be the xml Element object to parse, an xccdf Group or a
+    checklist VULN, or a cklb rule dictionary
     xccdf should be the parent Xccdf object
     result_element should be the result Element object for this Vuln
     namespace should be an xml namespace dict
@@ -417,12 +888,77 @@ class Vuln():
     SEVERITY_CAT_II = 'medium'
     SEVERITY_CAT_III = 'low'
 
+    # vuln attribute names, in checklist order
+    ATTR_NAMES = ('Vuln_Num', 'Severity', 'Group_Title', 'Rule_ID', 'Rule_Ver',
+                  'Rule_Title', 'Vuln_Discuss', 'IA_Controls', 'Check_Content',
+                  'Fix_Text', 'False_Positives', 'False_Negatives',
+                  'Documentable', 'Mitigations', 'Potential_Impact',
+                  'Third_Party_Tools', 'Mitigation_Control', 'Responsibility',
+                  'Security_Override_Guidance', 'Check_Content_Ref', 'Weight',
+                  'Class', 'STIGRef', 'TargetKey', 'STIG_UUID')
+    ATTR_INDEX = {name: index for index, name in enumerate(ATTR_NAMES)}
+
+    # attributes that usually repeat from vuln to vuln, their values are
+    # interned so every Vuln shares a single copy
+    SHARED_ATTRS = ('Severity', 'Group_Title', 'IA_Controls', 'False_Positives',
+                    'False_Negatives', 'Documentable', 'Mitigations',
+                    'Potential_Impact', 'Third_Party_Tools',
+                    'Mitigation_Control', 'Responsibility',
+                    'Security_Override_Guidance', 'Check_Content_Ref', 'Weight',
+                    'Class', 'STIGRef', 'TargetKey', 'STIG_UUID')
+
+    # attributes parsed from the xml inside the rule description text, and
+    # their description tags, in checklist order
+    DESC_ATTRS = {'Vuln_Discuss': 'VulnDiscussion',
+                  'IA_Controls': 'IAControls',
+                  'False_Positives': 'FalsePositives',
+                  'False_Negatives': 'FalseNegatives',
+                  'Documentable': 'Documentable',
+                  'Mitigations': 'Mitigations',
+                  'Potential_Impact': 'PotentialImpacts',
+                  'Third_Party_Tools': 'ThirdPartyTools',
+                  'Mitigation_Control': 'MitigationControl',
+                  'Responsibility': 'Responsibility',
+                  'Security_Override_Guidance': 'SeverityOverrideGuidance'}
+
+    # cklb rule keys and the attributes they hold, in cklb order. Check_Content_Ref
+    # is held by the "check_content_ref" object
+    CKLB_ATTRS = (('stig_uuid', 'STIG_UUID'), ('target_key', 'TargetKey'),
+                  ('stig_ref', 'STIGRef'), ('group_id', 'Vuln_Num'),
+                  ('rule_id_src', 'Rule_ID'), ('weight', 'Weight'),
+                  ('classification', 'Class'), ('severity', 'Severity'),
+                  ('rule_version', 'Rule_Ver'), ('group_title', 'Group_Title'),
+                  ('rule_title', 'Rule_Title'), ('fix_text', 'Fix_Text'),
+                  ('false_positives', 'False_Positives'),
+                  ('false_negatives', 'False_Negatives'),
+                  ('discussion', 'Vuln_Discuss'),
+                  ('check_content', 'Check_Content'),
+                  ('documentable', 'Documentable'),
+                  ('mitigations', 'Mitigations'),
+                  ('potential_impacts', 'Potential_Impact'),
+                  ('third_party_tools', 'Third_Party_Tools'),
+                  ('mitigation_control', 'Mitigation_Control'),
+                  ('responsibility', 'Responsibility'),
+                  ('security_override_guidance', 'Security_Override_Guidance'),
+                  ('ia_controls', 'IA_Controls'))
+
+    # checklist statuses and their cklb names
+    CKLB_STATUSES = {STATUS_NOT_REVIEWED: 'not_reviewed',
+                     STATUS_OPEN: 'open',
+                     STATUS_NOT_A_FINDING: 'not_a_finding',
+                     STATUS_NOT_APPLICABLE: 'not_applicable'}
+
+    # there can be many thousands of Vulns in memory, keep them compact
+    __slots__ = ('parent', 'ns', 'values', 'extra', 'description',
+                 'legacy_ids', 'cci_refs', 'status', 'finding_details',
+                 'comments', 'severity_override', 'severity_justification')
+
     def __init__(self, element, xccdf, result_element=None, namespace=None):
 
         # setup instance vars
         self.parent = xccdf
         self.ns = namespace
-        self.attrs = {}
+        self.extra = None
         self.legacy_ids = []
         self.cci_refs = []
 
@@ -432,51 +968,54 @@ class Vuln():
         self.severity_override = ''
         self.severity_justification = ''
 
+        # read back from a checklist
+        if isinstance(element, dict):
+            self._readrule(element)
+            return
+        if element.tag == 'VULN':
+            self._readvuln(element)
+            return
+
         # build attrs dictionary
+        attrs = {}
         rule = element.find('d:Rule', self.ns)
-        self.attrs['Vuln_Num'] = element.attrib.get('id')
-        self.attrs['Severity'] = rule.get('severity')
-        self.attrs['Group_Title'] = element.find('d:title', self.ns).text
-        self.attrs['Rule_ID'] = rule.get('id')
-        self.attrs['Rule_Ver'] = rule.find('d:version', self.ns).text
-        self.attrs['Rule_Title'] = rule.find('d:title', self.ns).text
-
-        # parse the xml inside the rule description text
-        desc_el = ElementTree.fromstring(
-            '<desc>'+rule.find('d:description', self.ns).text+'</desc>')
-        self.attrs['Vuln_Discuss'] = desc_el.find('VulnDiscussion').text
-        self.attrs['IA_Controls'] = desc_el.find('IAControls').text
+        attrs['Vuln_Num'] = element.attrib.get('id')
+        attrs['Severity'] = rule.get('severity')
+        attrs['Group_Title'] = element.find('d:title', self.ns).text
+        attrs['Rule_ID'] = rule.get('id')
+        attrs['Rule_Ver'] = rule.find('d:version', self.ns).text
+        attrs['Rule_Title'] = rule.find('d:title', self.ns).text
+
+        # keep the xml inside the rule description text, it is only parsed
+        # when one of its attributes is used (see parsedescription())
+        self.description = rule.find('d:description', self.ns).text
+        for name in Vuln.DESC_ATTRS:
+            attrs[name] = None
 
         # result xccdfs usually don't have this field, need to be careful
-        self.attrs['Check_Content'] = None
+        attrs['Check_Content'] = None
         check_con_el = rule.find('d:check', self.ns).find(
             'd:check-content', self.ns)
         if ElementTree.iselement(check_con_el):
-            self.attrs['Check_Content'] = check_con_el.text
-
-        self.attrs['Fix_Text'] = rule.find('d:fixtext', self.ns).text
-        self.attrs['False_Positives'] = desc_el.find('FalsePositives').text
-        self.attrs['False_Negatives'] = desc_el.find('FalseNegatives').text
-        self.attrs['Documentable'] = desc_el.find('Documentable').text
-        self.attrs['Mitigations'] = desc_el.find('Mitigations').text
-        self.attrs['Potential_Impact'] = desc_el.find('PotentialImpacts').text
-        self.attrs['Third_Party_Tools'] = desc_el.find('ThirdPartyTools').text
-        self.attrs['Mitigation_Control'] = desc_el.find(
-            'MitigationControl').text
-        self.attrs['Responsibility'] = desc_el.find('Responsibility').text
-        self.attrs['Security_Override_Guidance'] = desc_el.find(
-            'SeverityOverrideGuidance').text
-        self.attrs['Check_Content_Ref'] = rule.find('d:check', self.ns).find(
+            attrs['Check_Content'] = check_con_el.text
+
+        attrs['Fix_Text'] = rule.find('d:fixtext', self.ns).text
+        attrs['Check_Content_Ref'] = rule.find('d:check', self.ns).find(
             'd:check-content-ref', self.ns).get('name')
-        self.attrs['Weight'] = rule.get('weight')
+        attrs['Weight'] = rule.get('weight')
         # NEEDFIX dont know where this is coming from
         # (could be from filename starts with "U_" means unclass? "U_RHEL_7_STIG_V3R1_Manual-xccdf.xml")
         # (could be from "<?xml-stylesheet type='text/xsl' href='STIG_unclass.xsl'?>" in stig?)
-        self.attrs['Class'] = ''
-        self.attrs['STIGRef'] = self.getparent().getref()
-        self.attrs['TargetKey'] = rule.find(
+        attrs['Class'] = ''
+        attrs['STIGRef'] = self.getparent().getref()
+        attrs['TargetKey'] = rule.find(
             'd:reference', self.ns).find('dc:identifier', self.ns).text
-        self.attrs['STIG_UUID'] = self.getparent().getuuid()
+        attrs['STIG_UUID'] = self.getparent().getuuid()
+
+        # store attribute values in ATTR_NAMES order, sharing repeated values
+        for name in Vuln.SHARED_ATTRS:
+            attrs[name] = intern(attrs[name])
+        self.values = [attrs[name] for name in Vuln.ATTR_NAMES]
 
         # setup list for legacy ID's, CCI References
         for ident in rule.findall('d:ident', self.ns):
@@ -484,17 +1023,70 @@ class Vuln():
             if ident.text[0:2] == 'V-' or ident.text[1:3] == 'V-':
                 self.legacy_ids.append(ident.text)
             if ident.text[0:3] == 'CCI':
-                self.cci_refs.append(ident.text)
+                self.cci_refs.append(intern(ident.text))
 
         # update result vars if we got result
         if result_element:
-            result = result_element.find('d:result', self.ns).text
-            if result == 'pass':
-                self.status = Vuln.STATUS_NOT_A_FINDING
-            if result == 'fail':
-                self.status = Vuln.STATUS_OPEN
-            self.finding_details = 'Tool: ' + self.getparent().results_tool + '\nTime: ' + \
-                self.getparent().results_time + '\nResult: ' + result
+            self.setresult(result_element.find('d:result', self.ns).text)
+
+    def _readvuln(self, element):
+        '''Build this Vuln from a checklist VULN Element.'''
+
+        # every attribute is already parsed, unknown attributes are kept
+        self.description = None
+        attrs = dict.fromkeys(Vuln.ATTR_NAMES)
+        for stig_data_el in element.iterfind('STIG_DATA'):
+            name = stig_data_el.findtext('VULN_ATTRIBUTE')
+            value = stig_data_el.findtext('ATTRIBUTE_DATA')
+            if name == 'LEGACY_ID':
+                self.legacy_ids.append(value)
+            elif name == 'CCI_REF':
+                self.cci_refs.append(intern(value))
+            elif name in Vuln.ATTR_INDEX:
+                attrs[name] = value
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[name] = value
+
+        for name in Vuln.SHARED_ATTRS:
+            attrs[name] = intern(attrs[name])
+        self.values = [attrs[name] for name in Vuln.ATTR_NAMES]
+
+        self.status = element.findtext('STATUS') or Vuln.STATUS_NOT_REVIEWED
+        self.finding_details = element.findtext('FINDING_DETAILS', '')
+        self.comments = element.findtext('COMMENTS', '')
+        self.severity_override = element.findtext('SEVERITY_OVERRIDE', '')
+        self.severity_justification = element.findtext(
+            'SEVERITY_JUSTIFICATION', '')
+
+    def _readrule(self, rule):
+        '''Build this Vuln from a cklb rule dictionary.'''
+
+        # rule ids without a source id lack the "_rule" suffix
+        self.description = None
+        attrs = dict.fromkeys(Vuln.ATTR_NAMES)
+        for key, name in Vuln.CKLB_ATTRS:
+            attrs[name] = rule.get(key)
+        if not attrs['Rule_ID'] and rule.get('rule_id'):
+            attrs['Rule_ID'] = rule['rule_id'] + '_rule'
+        attrs['Check_Content_Ref'] = (rule.get('check_content_ref') or {}).get('name')
+
+        for name in Vuln.SHARED_ATTRS:
+            attrs[name] = intern(attrs[name])
+        self.values = [attrs[name] for name in Vuln.ATTR_NAMES]
+
+        self.legacy_ids = list(rule.get('legacy_ids') or [])
+        self.cci_refs = [intern(cci) for cci in rule.get('ccis') or []]
+
+        for status, name in Vuln.CKLB_STATUSES.items():
+            if rule.get('status') == name:
+                self.status = status
+        self.finding_details = rule.get('finding_details') or ''
+        self.comments = rule.get('comments') or ''
+        override = (rule.get('overrides') or {}).get('severity') or {}
+        self.severity_override = override.get('severity') or ''
+        self.severity_justification = override.get('reason') or ''
 
     def getparent(self):
         '''Return the parent Xccdf object for this Vuln.'''
@@ -522,7 +1114,7 @@ class Vuln():
             return stig_data_el
 
         # add each vuln attribute
-        for name, value in self.attrs.items():
+        for name, value in self.iterattrs():
             vuln_el.append(getattrxml(name, value))
 
         # add each vuln legacy id attribute
@@ -548,14 +1140,103 @@ class Vuln():
         # return the root xml Element
         return vuln_el
 
+    def torule(self):
+        '''
+        Return a dictionary representing this Vuln as a cklb rule.
+
+        Attributes without a cklb key (other than the known ATTR_NAMES) are
+        left out.
+        '''
+
+        self.parsedescription()
+        values = self.values
+        ruleid = values[Vuln.ATTR_INDEX['Rule_ID']] or ''
+
+        rule = {'uuid': str(uuid.uuid4())}
+        for key, name in Vuln.CKLB_ATTRS:
+            rule[key] = values[Vuln.ATTR_INDEX[name]] or ''
+        rule['rule_id'] = ruleid[:-5] if ruleid.endswith('_rule') else ruleid
+        rule['group_id_src'] = rule['group_id']
+        rule['check_content_ref'] = {
+            'href': '', 'name': values[Vuln.ATTR_INDEX['Check_Content_Ref']] or ''}
+        rule['legacy_ids'] = self.legacy_ids
+        rule['ccis'] = self.cci_refs
+        rule['group_tree'] = [{'id': rule['group_id'], 'title': rule['group_title'],
+                               'description': '<GroupDescription></GroupDescription>'}]
+        rule['status'] = Vuln.CKLB_STATUSES.get(self.status, 'not_reviewed')
+
+        rule['overrides'] = {}
+        if self.severity_override:
+            rule['overrides']['severity'] = {
+                'severity': self.severity_override,
+                'reason': self.severity_justification}
+        rule['comments'] = self.comments
+        rule['finding_details'] = self.finding_details
+        return rule
+
+    @property
+    def attrs(self):
+        '''Dictionary-like view of this Vuln's attributes, see VulnAttrs.'''
+        return VulnAttrs(self)
+
     def getattrs(self):
         '''Return a dictionary containing this Vuln's attributes.'''
         return self.attrs
 
+    def parsedescription(self):
+        '''
+        Parse the xml inside the rule description text into attributes.
+
+        This happens on first use of a description attribute (Vuln_Discuss,
+        IA_Controls, etc.), calling it again does nothing.
+        '''
+
+        if self.description is None:
+            return
+
+        desc_el = ElementTree.fromstring('<desc>'+self.description+'</desc>')
+        for name, tag in Vuln.DESC_ATTRS.items():
+            value = desc_el.find(tag).text
+            if name in Vuln.SHARED_ATTRS:
+                value = intern(value)
+            self.values[Vuln.ATTR_INDEX[name]] = value
+        self.description = None
+
+    def iterattrs(self):
+        '''Return an iterator of (name, value) tuples of this Vuln's attributes.'''
+
+        self.parsedescription()
+        pairs = zip(Vuln.ATTR_NAMES, self.values)
+        if self.extra:
+            return itertools.chain(pairs, self.extra.items())
+        return pairs
+
     def getid(self):
         '''Return the ID of this Vuln.'''
         return self.attrs.get('Vuln_Num')
 
+    def setresult(self, result):
+        '''
+        Set this Vuln's status and finding details from an xccdf result.
+
+        result should be an xccdf result string ("pass", "fail", etc.)
+        '''
+
+        if result == 'pass':
+            self.status = Vuln.STATUS_NOT_A_FINDING
+        if result == 'fail':
+            self.status = Vuln.STATUS_OPEN
+        self.finding_details = 'Tool: ' + self.getparent().results_tool + '\nTime: ' + \
+            self.getparent().results_time + '\nResult: ' + result
+
+    def getmergekey(self):
+        '''
+        Return the key used to match this Vuln with Vulns from other Xccdfs.
+
+        Returns tuple (Group_Title, Rule_Ver)
+        '''
+        return (self.attrs.get('Group_Title'), self.attrs.get('Rule_Ver'))
+
     def importresult(self, vuln):
         '''
         Import result from another Vuln.
@@ -567,25 +1248,1304 @@ class Vuln():
         self.finding_details = vuln.finding_details
 
 
+class VulnAttrs(collections.abc.MutableMapping):
+    '''
+    This class is a dictionary-like view of a Vuln's attributes.
+
+    vuln should be the Vuln object
+
+    Reads and writes go straight to the Vuln. Every name in Vuln.ATTR_NAMES is
+    always present, other names can be added and removed like in a dict.
+    '''
+
+    __slots__ = ('vuln',)
+
+    def __init__(self, vuln):
+        self.vuln = vuln
+
+    def __getitem__(self, name):
+        index = Vuln.ATTR_INDEX.get(name)
+        if index is not None:
+            if name in Vuln.DESC_ATTRS:
+                self.vuln.parsedescription()
+            return self.vuln.values[index]
+        if self.vuln.extra and name in self.vuln.extra:
+            return self.vuln.extra[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        index = Vuln.ATTR_INDEX.get(name)
+        if index is not None:
+            if name in Vuln.DESC_ATTRS:
+                self.vuln.parsedescription()
+            self.vuln.values[index] = value
+        else:
+            if self.vuln.extra is None:
+                self.vuln.extra = {}
+            self.vuln.extra[name] = value
+
+    def __delitem__(self, name):
+        if name in Vuln.ATTR_INDEX:
+            raise TypeError('Vuln attribute ' + name + ' can not be removed')
+        if not self.vuln.extra or name not in self.vuln.extra:
+            raise KeyError(name)
+        del self.vuln.extra[name]
+
+    def __iter__(self):
+        for name, value in self.vuln.iterattrs():
+            yield name
+
+    def __len__(self):
+        return len(Vuln.ATTR_NAMES) + len(self.vuln.extra or ())
+
+    def __repr__(self):
+        return repr(dict(self.vuln.iterattrs()))
+
+
+class Background():
+    '''
+    This class represents a function call running in a background thread.
+
+    function is called with args right away. The thread is a daemon thread, a
+    call that hangs (a stuck resolver) never keeps genckl from exiting.
+    '''
+
+    def __init__(self, function, *args):
+
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, args=(function, args), daemon=True)
+        self.thread.start()
+
+    def _run(self, function, args):
+
+        try:
+            self.value = function(*args)
+        except Exception as err:
+            self.error = err
+
+    def result(self, timeout=None, default=None):
+        '''
+        Return the value returned by the function call.
+
+        timeout should be the number of seconds to wait, or None to wait until
+        the call returns. default is returned if the call raised an exception or
+        did not return in time.
+        '''
+
+        self.thread.join(timeout)
+        if self.thread.is_alive() or self.error is not None:
+            return default
+        return self.value
+
+
+def intern(value):
+    '''Return a shared copy of value if it is a string, else value.'''
+
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+def loadfile(filename, stream=False, cache=None, select=None):
+    '''
+    Return a list of Xccdf objects from an xccdf filename or STIG zip filename.
+
+    stream is passed on to Xccdf
+    cache may be an XccdfCache object to load the Xccdfs through
+    select is passed on to iterstigzip() for zip files
+
+    filename may also be an ARF report (see readarf()). A zip file yields
+    every xccdf it contains, raises ValueError if there are none.
+    '''
+
+    def load(xml):
+        if cache:
+            return cache.load(xml, stream)
+        return Xccdf(xml, stream)
+
+    # ARF reports always have results, they are never cached
+    if filename[-4:] != '.zip':
+        if isarf(filename):
+            return readarf(filename)
+        return [load(filename)]
+
+    # each member is parsed before the next one is opened
+    xccdfs = [load(xml) for xml in iterstigzip(filename, select)]
+    if not xccdfs:
+        raise ValueError(filename + ': no matching xccdf found in zip')
+    return xccdfs
+
+
+class ArfTarget():
+    '''
+    This class is an XMLParser target building only the parts of an ARF report
+    used by readarf().
+
+    Elements are only built for the header elements and Groups of xccdf
+    Benchmarks, the children of xccdf TestResults and asset identification
+    computing-devices. Everything else is skipped as it is parsed, elements
+    outside the xccdf and SCAP namespaces (OVAL definitions and results,
+    system characteristics, etc.) are skipped with everything in them without
+    looking at their tags. Each element built is appended to items as a
+    (kind, Element) tuple, kind is one of "benchmark" (the Benchmark Element
+    without children), "header", "group", "benchmark-end" (Element is None),
+    "testresult" (without children), "result" or "asset".
+    '''
+
+    def __init__(self):
+
+        self.items = []
+        self.depth = 0
+        self.builder = None
+        self.builddepth = None
+        self.kind = None
+        self.benchmarkdepth = None
+        self.testresultdepth = None
+        self.skipdepth = None
+
+        # text is only collected here, it is passed on or dropped at the next
+        # start or end tag, much cheaper than a python call per text chunk
+        self.texts = []
+        self.data = self.texts.append
+
+    def start(self, tag, attrib):
+
+        self.depth = self.depth + 1
+        if self.builder is not None:
+            self.flush()
+            self.builder.start(tag, attrib)
+            return
+        if self.texts:
+            del self.texts[:]
+        if self.skipdepth is not None:
+            return
+
+        kind = None
+        if not tag.startswith(('{' + XCCDF_NS, '{' + SCAP_NS)):
+            self.skipdepth = self.depth
+        elif tag.endswith('}TestResult') and tag.startswith('{' + XCCDF_NS):
+            self.testresultdepth = self.depth
+            self.items.append(('testresult', ElementTree.Element(tag, attrib)))
+        elif tag.endswith('}Benchmark') and tag.startswith('{' + XCCDF_NS):
+            self.benchmarkdepth = self.depth
+            self.items.append(('benchmark', ElementTree.Element(tag, attrib)))
+        elif self.depth - 1 == self.benchmarkdepth:
+            name = splittag(tag)[1]
+            if name == 'Group':
+                kind = 'group'
+            elif name in Xccdf.HEADER_TAGS:
+                kind = 'header'
+            else:
+                self.skipdepth = self.depth
+        elif self.depth - 1 == self.testresultdepth:
+            kind = 'result'
+        elif tag == '{' + AI_NS + '}computing-device':
+            kind = 'asset'
+
+        # build this element and everything in it
+        if kind:
+            self.kind = kind
+            self.builddepth = self.depth
+            self.builder = ElementTree.TreeBuilder()
+            self.builder.start(tag, attrib)
+
+    def end(self, tag):
+
+        if self.builder is not None:
+            self.flush()
+            self.builder.end(tag)
+            if self.depth == self.builddepth:
+                self.items.append((self.kind, self.builder.close()))
+                self.builder = None
+        else:
+            if self.texts:
+                del self.texts[:]
+            if self.skipdepth is not None:
+                if self.depth == self.skipdepth:
+                    self.skipdepth = None
+            elif self.depth == self.benchmarkdepth:
+                self.items.append(('benchmark-end', None))
+                self.benchmarkdepth = None
+            elif self.depth == self.testresultdepth:
+                self.testresultdepth = None
+        self.depth = self.depth - 1
+
+    def flush(self):
+        '''Pass the text collected since the last tag on to the builder.'''
+
+        if self.texts:
+            self.builder.data(''.join(self.texts))
+            del self.texts[:]
+
+    def close(self):
+
+        return None
+
+
+@stats.timed('parse')
+def readarf(source):
+    '''
+    Return a list of Xccdf objects with results from an ARF report.
+
+    source is a filename or file object containing an ARF (Asset Reporting
+    Format) report, as written by OpenSCAP
+
+    The report is parsed a chunk at a time, only the xccdf benchmarks,
+    TestResults and asset data are built (see ArfTarget). The results of each
+    TestResult are applied to the benchmark it references, the result Xccdf's
+    asset holds the host name, FQDN, IP and MAC address of the scanned host.
+    Raises ValueError if there is no TestResult with results.
+    '''
+
+    # try to open, assume already open if wrong type
+    try:
+        xml = open(source, 'rb')
+    except TypeError:
+        xml = source
+    filename = getattr(xml, 'name', '')
+
+    target = ArfTarget()
+    parser = ElementTree.XMLParser(target=target)
+    benchmarks = []
+    testresults = []
+    devices = []
+    xccdf = None
+    root = None
+    header = {}
+
+    def readitems():
+        nonlocal xccdf, root, header
+        for kind, elem in target.items:
+            if kind == 'benchmark':
+                xccdf = Xccdf(None)
+                xccdf.ns = {'d': splittag(elem.tag)[0], 'dc': DC_NS}
+                root = elem
+                header = {}
+            elif kind == 'header':
+                header.setdefault(splittag(elem.tag)[1], elem)
+            elif kind == 'group':
+                if not xccdf.attrs:
+                    xccdf._setattrs(root, header, filename)
+                xccdf.vulns.append(Vuln(elem, xccdf, None, xccdf.ns))
+            elif kind == 'benchmark-end':
+                if not xccdf.attrs:
+                    xccdf._setattrs(root, header, filename)
+                benchmarks.append(xccdf)
+            elif kind == 'testresult':
+                testresults.append({'element': elem, 'benchmark': None,
+                                    'results': {}, 'facts': {}})
+            elif kind == 'result':
+                readtestresult(testresults[-1], elem)
+            elif kind == 'asset':
+                devices.append(elem)
+        del target.items[:]
+
+    try:
+        chunk = xml.read(1024*1024)
+        while chunk:
+            parser.feed(chunk)
+            readitems()
+            chunk = xml.read(1024*1024)
+        parser.close()
+        readitems()
+    finally:
+        xml.close()
+
+    # apply each TestResult to its benchmark, the only one if not referenced
+    xccdfs = []
+    for testresult in testresults:
+        if not testresult['results']:
+            continue
+        matches = [xccdf for xccdf in benchmarks
+                   if xccdf.getid() == testresult['benchmark']]
+        if not matches and len(benchmarks) == 1:
+            matches = benchmarks
+        for xccdf in matches:
+            xccdf.hasresults = True
+            xccdf.results_tool = testresult['element'].get('test-system')
+            xccdf.results_time = testresult['element'].get('start-time')
+            xccdf.asset = arfasset(testresult['facts'], devices)
+            matched = 0
+            for vuln in xccdf.vulns:
+                result = testresult['results'].get(vuln.attrs['Rule_ID'])
+                if result is not None:
+                    matched = matched + 1
+                    vuln.setresult(result)
+            stats.count('results_matched', matched)
+            stats.count('vulns_parsed', len(xccdf.vulns))
+            if xccdf not in xccdfs:
+                xccdfs.append(xccdf)
+
+    if not xccdfs:
+        raise ValueError(os.path.basename(filename) +
+                         ': no xccdf TestResult with results found in ARF report')
+    return xccdfs
+
+
+def readtestresult(testresult, elem):
+    '''
+    Add a TestResult child Element to a testresult dictionary (see readarf()).
+
+    Keeps rule-result results by rule ID (the last one wins), the referenced
+    benchmark ID and the target, target-address and target-facts values.
+    '''
+
+    namespace, name = splittag(elem.tag)
+    prefix = '{' + namespace + '}'
+    facts = testresult['facts']
+    if name == 'rule-result':
+        result_el = elem.find(prefix + 'result')
+        if result_el is not None:
+            testresult['results'][elem.get('idref')] = result_el.text
+    elif name == 'benchmark':
+        testresult['benchmark'] = elem.get('id')
+    elif name == 'target' or name == 'target-address':
+        facts.setdefault(name, []).append(elem.text)
+    elif name == 'target-facts':
+        for fact_el in elem.iterfind(prefix + 'fact'):
+            facts.setdefault(fact_el.get('name'), []).append(fact_el.text)
+
+
+def arfasset(facts, devices):
+    '''
+    Return checklist asset data for the host scanned in an ARF report.
+
+    facts should be a dictionary of lists of TestResult target facts
+    devices should be a list of asset identification computing-device Elements
+
+    Only values found are returned, loopback addresses and empty MAC addresses
+    are skipped.
+    '''
+
+    device = {}
+    for device_el in devices:
+        for elem in device_el.iter():
+            if elem.text and elem.text.strip():
+                device.setdefault(splittag(elem.tag)[1], []).append(elem.text.strip())
+
+    def first(values, skip=()):
+        for value in values:
+            if value and not value.startswith(skip):
+                return value
+        return ''
+
+    asset = {}
+    asset['HOST_NAME'] = first(facts.get('urn:xccdf:fact:asset:identifier:host_name', []) +
+                               device.get('hostname', []) + facts.get('target', []))
+    asset['HOST_FQDN'] = first(facts.get('urn:xccdf:fact:asset:identifier:fqdn', []) +
+                               device.get('fqdn', []))
+    asset['HOST_IP'] = first(facts.get('urn:xccdf:fact:asset:identifier:ipv4', []) +
+                             device.get('ip-v4', []) + facts.get('target-address', []),
+                             ('127.', '::1', '0.0.0.0'))
+    asset['HOST_MAC'] = first(facts.get('urn:xccdf:fact:asset:identifier:mac', []) +
+                              facts.get('urn:xccdf:fact:ethernet:MAC', []) +
+                              device.get('mac-address', []),
+                              ('00:00:00:00:00:00',)).upper().replace(':', '-')
+    return dict((name, value) for name, value in asset.items() if value)
+
+
+def splittag(tag):
+    '''Return a (namespace, local name) tuple for an Element tag.'''
+
+    if tag[0] == '{':
+        namespace, name = tag[1:].split('}', 1)
+        return namespace, name
+    return '', tag
+
+
+def isarf(filename):
+    '''Return True if filename is an ARF report, reading only its root element.'''
+
+    with open(filename, 'rb') as xml:
+        for event, elem in ElementTree.iterparse(xml, events=('start',)):
+            return elem.tag == '{http://scap.nist.gov/schema/asset-reporting-format/1.1}asset-report-collection'
+    return False
+
+
+def readckl(source):
+    '''
+    Return a Ckl read from an existing checklist.
+
+    source is a filename or file object containing a ckl (as written by
+    write() or STIG Viewer)
+
+    The checklist is read one VULN at a time. Asset data, STIG info, uuids and
+    every Vuln attribute, status, finding details, comments and severity
+    override are kept. Each iSTIG becomes an Xccdf without results, so results
+    and templates added to the Ckl later are applied on top of it.
+    '''
+
+    # try to open, assume already open if wrong type
+    try:
+        xml = open(source, 'rb')
+    except TypeError:
+        xml = source
+
+    checklist = Ckl()
+    xccdf = None
+    istig_el = None
+    try:
+        for event, elem in ElementTree.iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == 'iSTIG':
+                    xccdf = Xccdf(None)
+                    istig_el = elem
+
+            elif elem.tag == 'ASSET':
+                for asset_el in elem:
+                    checklist.asset[asset_el.tag] = asset_el.text or ''
+                elem.clear()
+
+            elif elem.tag == 'STIG_INFO':
+                for si_data_el in elem.iterfind('SI_DATA'):
+                    xccdf.attrs[si_data_el.findtext('SID_NAME')] = \
+                        si_data_el.findtext('SID_DATA', '')
+                istig_el.remove(elem)
+                elem.clear()
+
+            # vulns are dropped from the tree as soon as they are built
+            elif elem.tag == 'VULN':
+                xccdf.vulns.append(Vuln(elem, xccdf))
+                istig_el.remove(elem)
+                elem.clear()
+
+            # all vulns of a stig share its uuid, a stig without vulns is
+            # skipped like importxccdf() would
+            elif elem.tag == 'iSTIG':
+                if xccdf.vulns and xccdf.vulns[0].attrs['STIG_UUID']:
+                    xccdf.uuid = xccdf.vulns[0].attrs['STIG_UUID']
+                if xccdf.vulns:
+                    checklist.importxccdf(xccdf)
+                elem.clear()
+    finally:
+        xml.close()
+
+    return checklist
+
+
+def readcklb(source):
+    '''
+    Return a Ckl read from an existing cklb (STIG Viewer 3) checklist.
+
+    source is a filename or file object containing a cklb (as written by
+    write() or STIG Viewer 3)
+
+    Target data, STIG info, every rule attribute with a checklist equivalent,
+    status, finding details, comments and severity override are kept. Each
+    stig becomes an Xccdf without results, like readckl().
+    '''
+
+    # try to open, assume already open if wrong type
+    try:
+        f = open(source, 'rb')
+    except TypeError:
+        f = source
+
+    try:
+        document = json.load(f)
+    finally:
+        f.close()
+    if not isinstance(document, dict) or not isinstance(document.get('stigs'), list):
+        raise ValueError(getattr(f, 'name', 'cklb') + ': not a cklb checklist')
+
+    checklist = Ckl()
+    target_data = document.get('target_data') or {}
+    for key, name in CKLB_TARGET_DATA:
+        if key in target_data:
+            checklist.asset[name] = target_data[key] or ''
+    if 'is_web_database' in target_data:
+        checklist.asset['WEB_OR_DATABASE'] = \
+            'true' if target_data['is_web_database'] else 'false'
+
+    # stig info a cklb doesn't have is left empty
+    for stig in document['stigs']:
+        xccdf = Xccdf(None)
+        xccdf.attrs = {'version': stig.get('version') or '',
+                       'classification': '',
+                       'customname': '',
+                       'stigid': stig.get('stig_id') or '',
+                       'description': '',
+                       'filename': '',
+                       'releaseinfo': stig.get('release_info') or '',
+                       'title': stig.get('stig_name') or stig.get('display_name') or '',
+                       'uuid': '',
+                       'notice': '',
+                       'source': ''}
+        # the stig uuid is both the STIG_INFO uuid and every rule's STIG_UUID
+        xccdf.uuid = stig.get('uuid') or xccdf.uuid
+        xccdf.attrs['uuid'] = xccdf.uuid
+        for rule in stig.get('rules') or []:
+            vuln = Vuln(rule, xccdf)
+            vuln.attrs['STIG_UUID'] = xccdf.uuid
+            xccdf.vulns.append(vuln)
+        if xccdf.vulns:
+            checklist.importxccdf(xccdf)
+
+    return checklist
+
+
+def readchecklist(source):
+    '''
+    Return a Ckl read from an existing ckl or cklb checklist.
+
+    source is a filename or a seekable binary file object, the format is
+    detected from the content (see openchecklist(), readckl() and readcklb())
+    '''
+
+    f, fmt = openchecklist(source)
+    if fmt == 'cklb':
+        return readcklb(f)
+    return readckl(f)
+
+
+def openchecklist(source):
+    '''
+    Return a (binary file object, format) tuple for an existing checklist.
+
+    source is a filename or a seekable binary file object
+
+    The format is "cklb" if the checklist is a JSON object, "ckl" otherwise.
+    Checklists compressed by openoutput() are decompressed as they are read,
+    closing the returned file object closes the file opened for source.
+    '''
+
+    # try to open, assume already open if wrong type
+    try:
+        f = open(source, 'rb')
+    except TypeError:
+        f = source
+
+    opener = None
+    magic = f.read(6)
+    f.seek(0)
+    if magic.startswith(b'\x1f\x8b'):
+        opener = gzip.open
+    elif magic.startswith(b'\xfd7zXZ\x00'):
+        opener = lzma.open
+    elif magic.startswith(b'\x28\xb5\x2f\xfd') and zstd is not None:
+        opener = zstd.open
+
+    # decompressing file objects only close files they opened themselves and
+    # may not seek backwards, peek at their data instead
+    if opener is not None:
+        if f is source:
+            f = opener(f)
+        else:
+            f.close()
+            f = opener(source, 'rb')
+        if not hasattr(f, 'peek'):
+            f = io.BufferedReader(f)
+        head = f.peek(64)[:64]
+    else:
+        head = f.read(64)
+        f.seek(0)
+
+    head = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head.startswith(b'{'):
+        return f, 'cklb'
+    return f, 'ckl'
+
+
+def getoutputcompression(filename):
+    '''
+    Return the compression matching the suffix of an output filename (one of
+    COMPRESSIONS), or None.
+    '''
+
+    if isinstance(filename, str):
+        for name, (suffix, level, minimum, maximum) in COMPRESSIONS.items():
+            if filename.endswith(suffix):
+                return name
+    return None
+
+
+def getformat(filename, default='ckl'):
+    '''
+    Return the checklist format for an output filename.
+
+    Filenames ending in ".cklb", optionally followed by a compression suffix
+    (see COMPRESSIONS), are "cklb", anything else is default.
+    '''
+
+    if not isinstance(filename, str):
+        return default
+    for suffix, level, minimum, maximum in COMPRESSIONS.values():
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+    if filename.lower().endswith('.cklb'):
+        return 'cklb'
+    return default
+
+
+@stats.timed('load')
+def loadxccdfs(filenames, stream=False, cache=None, jobs=1, select=None):
+    '''
+    Return a list of Xccdf objects for a list of files, in the same order.
+
+    filenames should be a list of xccdf filenames or STIG zip filenames
+    stream, cache and select are passed on to loadfile()
+    jobs should be the number of worker processes used to parse the files
+    '''
+
+    load = functools.partial(loadfile, stream=stream, cache=cache, select=select)
+    jobs = min(jobs, len(filenames))
+    if jobs < 2:
+        filexccdfs = [load(filename) for filename in filenames]
+
+    # parse in worker processes, Xccdfs are pickled back in order. When
+    # profiling, each worker sends its phase timings and counters back too
+    elif stats.enabled:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(functools.partial(loadfileprofiled, load=load),
+                               filenames, chunksize=1)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        filexccdfs = []
+        for xccdflist, filestats in results:
+            filexccdfs.append(xccdflist)
+            stats.merge(filestats)
+
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            filexccdfs = pool.map(load, filenames, chunksize=1)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    xccdfs = []
+    for xccdflist in filexccdfs:
+        xccdfs.extend(xccdflist)
+    return xccdfs
+
+
+def loadfileprofiled(filename, load):
+    '''
+    Return a (list of Xccdf objects, stats.snapshot()) tuple for a file.
+
+    This is run in loadxccdfs() worker processes, load should be loadfile()
+    with its arguments applied.
+    '''
+
+    stats.enable()
+    return load(filename), stats.snapshot()
+
+
+def iterstigzip(source, select=None):
+    '''
+    Yield STIG xml data for every xccdf in a STIG zip file.
+
+    source should be a path to a zip, or an open zip file object
+    select may be a list of glob patterns, an xccdf is only yielded if its
+    member name, file name or benchmark ID matches one of them (ignoring case)
+
+    Yields open file objects, read straight from the zip. Each one is closed
+    when the next one is requested. Zips nested inside the zip are searched
+    too, stored (uncompressed) nested zips are read in place, compressed ones
+    are read into memory (never extracted to disk). Members that are not
+    selected are only read as far as their benchmark ID.
+    '''
+
+    with zipfile.ZipFile(source) as stigzip:
+        for info in stigzip.infolist():
+            innername = info.filename.lower()
+
+            # search nested zips, zipfile needs to seek. Stored members seek
+            # cheaply and are read in place, seeking back in a compressed one
+            # decompresses it again from the start, so read it into memory
+            if innername[-4:] == '.zip':
+                if info.compress_type == zipfile.ZIP_STORED:
+                    with stigzip.open(info) as innerzip:
+                        for innerfile in iterstigzip(innerzip, select):
+                            yield innerfile
+                    continue
+                with stats.phase('zip'), stigzip.open(info) as innerfile:
+                    innerzip = io.BytesIO(innerfile.read())
+                for innerfile in iterstigzip(innerzip, select):
+                    yield innerfile
+
+            elif innername[-9:] == 'xccdf.xml':
+                if select and not matchglobs(select, info.filename):
+                    with stats.phase('zip'), stigzip.open(info) as innerfile:
+                        if not matchglobs(select, getxccdfid(innerfile)):
+                            continue
+                with stigzip.open(info) as innerfile:
+                    yield innerfile
+
+
+def matchglobs(patterns, name):
+    '''
+    Return True if name, or its file name, matches any glob pattern, ignoring
+    case.
+    '''
+
+    if not name:
+        return False
+    names = [name.lower(), os.path.basename(name).lower()]
+    for pattern in patterns:
+        for candidate in names:
+            if fnmatch.fnmatchcase(candidate, pattern.lower()):
+                return True
+    return False
+
+
+def getxccdfid(xml):
+    '''
+    Return the ID of an xccdf benchmark, reading only as far as its root
+    element.
+
+    xml should be an open file object containing XML data in xccdf format
+    '''
+
+    for event, elem in ElementTree.iterparse(xml, events=('start',)):
+        return elem.get('id')
+    return None
+
+
 def openstigzip(filename):
     '''
     Return STIG xml data from a STIG zip file.
 
-    filename should be a path to a zip 
+    filename should be a path to a zip
 
-    Returns an open file object containing the STIG xml data
+    Returns a file object holding the STIG xml data of the first xccdf in the
+    zip (see iterstigzip()), read into memory so it outlives the zip. Raises
+    ValueError if there is none, see iterstigzip() for zips containing several
+    xccdfs.
     '''
 
-    stigzip = zipfile.ZipFile(filename)
-    for innername in stigzip.namelist():
-        if innername[-9:] == 'xccdf.xml':
-            innerfile = stigzip.open(innername)
-            break
-    stigzip.close()
-    return innerfile
+    innerfiles = iterstigzip(filename)
+    try:
+        for innerfile in innerfiles:
+            xml = io.BytesIO(innerfile.read())
+            xml.name = innerfile.name
+            return xml
+    finally:
+        innerfiles.close()
+    raise ValueError(filename + ': no xccdf found in zip')
+
 
+def openoutput(filename, compression=None, level=None, binary=False):
+    '''
+    Return a text file object checklists are written to.
+
+    filename should be a filename or an open file object, a text file object
+    (sys.stdout) is written to through its binary buffer when compressed
+    compression should be None or one of COMPRESSIONS
+    level should be the compression level, or None for the default level
+    binary should be True to return a binary file object instead
 
-def runinlinecmds(string, cmdtag='<cmd>'):
+    Compressed data is written as text is written, closing the returned file
+    object does not close a file object passed in as filename when compressed.
+    Raises ValueError if compression is not available.
+    '''
+
+    mode = 'wb' if binary else 'wt'
+    encoding = None if binary else 'UTF-8'
+
+    # try to open, if TypeError assume already open
+    if compression is None:
+        try:
+            return open(filename, mode, encoding=encoding)
+        except TypeError:
+            return filename
+
+    if compression not in COMPRESSIONS:
+        raise ValueError('unknown compression ' + str(compression))
+    if level is None:
+        level = COMPRESSIONS[compression][1]
+    if not isinstance(filename, (str, bytes, os.PathLike)):
+        filename = getattr(filename, 'buffer', filename)
+
+    if compression == 'gzip':
+        return gzip.open(filename, mode, compresslevel=level, encoding=encoding)
+    if compression == 'xz':
+        return lzma.open(filename, mode, preset=level, encoding=encoding)
+    if zstd is None:
+        raise ValueError('zstd compression needs python 3.14 or the zstandard module')
+    if zstd.__name__ == 'compression.zstd':
+        return zstd.open(filename, mode, level=level, encoding=encoding)
+    return zstd.open(filename, mode, cctx=zstd.ZstdCompressor(level=level),
+                     encoding=encoding, closefd=isinstance(filename, (str, bytes, os.PathLike)))
+
+
+def writeelement(output_file, element, level=0):
+    '''
+    Write an Element to a file in the STIG Viewer 2.11 layout.
+
+    output_file should be an open file object
+    element should be the Element object to write
+    level should be the indentation level of element
+
+    Each Element is written on its own line, indented with tabs. Elements
+    with text are written on a single line, elements without text or children
+    are never shortened to "<tag />".
+    '''
+
+    indent = '\t' * level
+    if len(element):
+        output_file.write(indent + '<' + element.tag + '>\n')
+        for child in element:
+            writeelement(output_file, child, level + 1)
+        output_file.write(indent + '</' + element.tag + '>\n')
+    else:
+        output_file.write(indent + '<' + element.tag + '>' +
+                          escapetext(element.text) + '</' + element.tag + '>\n')
+
+
+def escapetext(text):
+    '''
+    Return text escaped for use as xml Element text.
+
+    Line breaks are normalized to "\\n" the same way an xml parser and
+    str.splitlines() would.
+    '''
+
+    if not text:
+        return ''
+    text = text.replace('\r\n', '\n').translate(LINE_BREAKS)
+    return escape(text)
+
+
+def gethostdata(timeout=2.0):
+    '''
+    Return a dictionary of checklist asset data for the local host.
+
+    timeout should be the maximum number of seconds to wait for the name
+    lookups, all of them together
+
+    Dictionary will have the keys HOST_NAME, HOST_FQDN, HOST_IP and HOST_MAC.
+    The address and MAC are read locally from the primary network interface
+    (see primaryinterface()), name lookups are only used for the fully
+    qualified name, or if there is no interface to read. Lookups run at the
+    same time, a lookup that does not return in time is given up on.
+    '''
+
+    deadline = time.monotonic() + timeout
+    hostname = socket.gethostname()
+    fqdn = Background(socket.getfqdn, hostname)
+
+    interface = primaryinterface()
+    lookup = None
+    if interface:
+        name, address, mac = interface
+    else:
+        lookup = Background(socket.gethostbyname, hostname)
+        mac = '-'.join(('%012X' % uuid.getnode())[i:i+2] for i in range(0, 12, 2))
+
+    # the lookups share the deadline, waiting for one uses up time left for both
+    fqdn = fqdn.result(max(deadline - time.monotonic(), 0), hostname)
+    if lookup is not None:
+        address = lookup.result(max(deadline - time.monotonic(), 0), '')
+
+    return {'HOST_NAME': hostname,
+            'HOST_FQDN': fqdn,
+            'HOST_IP': address,
+            'HOST_MAC': mac}
+
+
+def primaryinterface():
+    '''
+    Return a (name, IPv4 address, MAC address) tuple for the primary network
+    interface, or None.
+
+    The primary interface is the one with the default route of lowest metric,
+    or else the first interface by name that is up, is not loopback and has an
+    address (ties are broken by name too). Interfaces are read from
+    /sys/class/net and /proc/net/route, so this only finds interfaces on Linux.
+    '''
+
+    try:
+        names = sorted(os.listdir('/sys/class/net'))
+    except OSError:
+        return None
+
+    # default routes are to 0.0.0.0 with mask 0.0.0.0
+    routes = []
+    try:
+        with open('/proc/net/route') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if len(fields) > 7 and fields[1] == '00000000' and \
+                        fields[7] == '00000000' and int(fields[3], 16) & RTF_UP:
+                    routes.append((int(fields[6]), fields[0]))
+    except (OSError, ValueError):
+        pass
+
+    for name in [name for metric, name in sorted(routes)] + names:
+        try:
+            flags = int(readsysfile(name, 'flags'), 16)
+        except ValueError:
+            continue
+        if not flags & IFF_UP or flags & IFF_LOOPBACK:
+            continue
+        address = interfaceaddress(name)
+        if address:
+            return (name, address, readsysfile(name, 'address').upper().replace(':', '-'))
+    return None
+
+
+def readsysfile(interface, name):
+    '''Return the stripped contents of /sys/class/net/interface/name, or ''.'''
+
+    try:
+        with open(os.path.join('/sys/class/net', interface, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def interfaceaddress(interface):
+    '''Return the IPv4 address of a network interface, or '' if it has none.'''
+
+    if fcntl is None:
+        return ''
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            ifreq = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, struct.pack(
+                '256s', interface[:15].encode('UTF-8')))
+    except OSError:
+        return ''
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+class Template():
+    '''
+    This class represents one or more ckl templates, normalized and merged.
+
+    rows maps each Vuln ID to a list of FIELDS values, status and severity
+    override are Vuln constants (Vuln.STATUS_OPEN, etc.), a value of None
+    leaves the Vuln attribute untouched. Adding a layer only replaces the
+    values it sets, the same as applying the templates one after another.
+    '''
+
+    # template columns kept, in the order of each rows value
+    FIELDS = ['status', 'findingdetails', 'comments', 'severityoverride',
+              'severityoverridejustification']
+
+    # template values (without spaces, lowercased) of status and severity
+    STATUSES = {'notreviewed': Vuln.STATUS_NOT_REVIEWED,
+                'open': Vuln.STATUS_OPEN,
+                'notafinding': Vuln.STATUS_NOT_A_FINDING,
+                'notapplicable': Vuln.STATUS_NOT_APPLICABLE}
+    SEVERITIES = {'cati': Vuln.SEVERITY_CAT_I, 'cat1': Vuln.SEVERITY_CAT_I,
+                  'catii': Vuln.SEVERITY_CAT_II, 'cat2': Vuln.SEVERITY_CAT_II,
+                  'catiii': Vuln.SEVERITY_CAT_III, 'cat3': Vuln.SEVERITY_CAT_III}
+
+    # first bytes of a compiled template, and its layout version
+    MAGIC = b'genckl-template\n'
+    FORMAT = 2
+
+    def __init__(self):
+
+        self.rows = {}
+        self.sources = []
+
+    def addrows(self, rows, source, strict=False):
+        '''
+        Add a layer of template rows.
+
+        rows should be a list of dictionaries as returned by readtemplate()
+        source should be the template filename, used in error messages
+        strict should be True to raise ValueError on status and severity
+        override values that are not understood, they are ignored otherwise
+
+        Rows without an ID are skipped. In strict mode a template without an ID
+        column raises ValueError.
+        '''
+
+        if strict and not any('id' in row for row in rows):
+            raise ValueError(source + ': template has no ID column')
+        self.sources.append(source)
+        for row in rows:
+            vulnid = (row.get('id') or '').strip()
+            if not vulnid:
+                continue
+            values = [None] * len(Template.FIELDS)
+
+            status = (row.get('status') or '').replace(' ', '').lower()
+            if status:
+                values[0] = Template.STATUSES.get(status)
+                if values[0] is None and strict:
+                    raise ValueError(source + ': ' + vulnid + ': unknown status "' +
+                                     row['status'] + '"')
+
+            for index in (1, 2, 4):
+                values[index] = row.get(Template.FIELDS[index]) or None
+
+            sevover = (row.get('severityoverride') or '').replace(' ', '').lower()
+            if sevover:
+                values[3] = Template.SEVERITIES.get(sevover)
+                if values[3] is None and strict:
+                    raise ValueError(source + ': ' + vulnid + ': unknown severity override "' +
+                                     row['severityoverride'] + '"')
+
+            self.setvalues(vulnid, values)
+
+    def update(self, template):
+        '''Add the rows of another Template as a layer on top of this one.'''
+
+        self.sources.extend(template.sources)
+        for vulnid, values in template.rows.items():
+            self.setvalues(vulnid, values)
+
+    def setvalues(self, vulnid, values):
+        '''Set the values of the row vulnid that are not None.'''
+
+        row = self.rows.get(vulnid)
+        if row is None:
+            self.rows[vulnid] = list(values)
+            return
+        for index, value in enumerate(values):
+            if value is not None:
+                row[index] = value
+
+    def todata(self):
+        '''Return this Template as a dictionary of json types (see templatefromdata()).'''
+
+        return {'format': Template.FORMAT, 'sources': self.sources,
+                'rows': self.rows}
+
+    def write(self, filename):
+        '''Write this Template to filename in compiled form (see loadtemplate()).'''
+
+        with open(filename, 'wb') as f:
+            f.write(Template.MAGIC)
+            f.write(json.dumps(self.todata(), ensure_ascii=False,
+                               separators=(',', ':')).encode('UTF-8'))
+
+
+def templatefromdata(data, source):
+    '''
+    Return a Template built from a dictionary returned by Template.todata().
+
+    source should be the filename data was read from, used in error messages
+
+    Only plain data is read, never code. Raises ValueError if data was written
+    by an incompatible genckl version or is not a valid template.
+    '''
+
+    if not isinstance(data, dict) or data.get('format') != Template.FORMAT:
+        raise ValueError(source + ': compiled by an incompatible genckl version, '
+                         'compile it again')
+    sources = data.get('sources')
+    rows = data.get('rows')
+    if not isinstance(sources, list) or not isinstance(rows, dict):
+        raise ValueError(source + ': not a valid compiled template')
+    statuses = set(Template.STATUSES.values())
+    severities = set(Template.SEVERITIES.values())
+    for values in rows.values():
+        if not isinstance(values, list) or len(values) != len(Template.FIELDS) or \
+                not all(value is None or isinstance(value, str) for value in values):
+            raise ValueError(source + ': not a valid compiled template')
+        if values[0] is not None and values[0] not in statuses or \
+                values[3] is not None and values[3] not in severities:
+            raise ValueError(source + ': not a valid compiled template')
+
+    template = Template()
+    template.sources = sources
+    template.rows = rows
+    return template
+
+
+@stats.timed('template')
+def loadtemplate(filename, strict=False):
+    '''
+    Return a Template read from a ckl template file.
+
+    filename should be a csv, yaml (".yaml" or ".yml"), json (".json") or
+    compiled template filename (see Template.write()), compiled templates are
+    recognized by their content
+    strict is passed on to Template.addrows()
+
+    Raises ValueError if a compiled template was written by an incompatible
+    genckl version.
+    '''
+
+    stats.count('templates_read')
+    with open(filename, 'rb') as f:
+        if f.read(len(Template.MAGIC)) == Template.MAGIC:
+            try:
+                data = json.loads(f.read().decode('UTF-8'))
+            except ValueError:
+                data = None
+            return templatefromdata(data, filename)
+
+    template = Template()
+    template.addrows(readtemplate(filename), filename, strict)
+    return template
+
+
+def loadtemplates(filenames, strict=False):
+    '''
+    Return a single Template merging several ckl templates in order.
+
+    filenames should be a list of template filenames (see loadtemplate())
+    strict is passed on to Template.addrows()
+    '''
+
+    template = Template()
+    for filename in filenames:
+        template.update(loadtemplate(filename, strict))
+    return template
+
+
+def findtemplates(directory):
+    '''
+    Return the list of template filenames in directory, in layering order.
+
+    directory is searched recursively for files ending in TEMPLATE_EXTENSIONS,
+    hidden files and directories are skipped. Filenames are sorted, the files
+    of a directory come before the files of its subdirectories.
+    '''
+
+    filenames = []
+    for dirpath, dirnames, names in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+        for name in sorted(names):
+            if not name.startswith('.') and \
+                    os.path.splitext(name)[1].lower() in TEMPLATE_EXTENSIONS:
+                filenames.append(os.path.join(dirpath, name))
+    return filenames
+
+
+def readtemplate(filename):
+    '''
+    Return a list of dictionaries, one for each row of a ckl template.
+
+    filename should be csv, yaml (".yaml" or ".yml") or json (".json")
+    filename
+
+    Dictionary keys are taken from the first row, with whitespace removed and
+    lowercased. yaml and json templates should hold either a list of rows
+    (objects keyed by column name, like a csv row) or an object of rows keyed
+    by ID, keys are cleaned the same way. An empty csv has no rows.
+
+    Raises ValueError if a yaml or json template can not be parsed.
+    '''
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.yaml', '.yml', '.json'):
+        with open(filename, encoding='UTF-8') as f:
+            if extension == '.json':
+                try:
+                    data = json.load(f)
+                except ValueError as err:
+                    raise ValueError(filename + ': ' + str(err))
+            elif yaml is None:
+                raise ValueError(filename + ': PyYAML is needed to read yaml templates')
+            else:
+                # yaml errors span several lines, keep them on one
+                try:
+                    data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+                except yaml.YAMLError as err:
+                    raise ValueError(filename + ': ' + ' '.join(str(err).split()))
+        return templaterows(data, filename)
+
+    # open file and read lines
+    with open(filename) as f:
+        csvlines = f.readlines()
+    if not csvlines:
+        return []
+
+    # clean first line as it's used for dictionary keys
+    csvlines[0] = csvlines[0].replace(' ', '').lower()
+
+    # parse each vuln template
+    return list(csv.DictReader(csvlines))
+
+
+def templaterows(data, filename):
+    '''
+    Return the list of template rows in data read from a yaml or json template.
+
+    Raises ValueError if data is not a list of rows or an object of rows keyed
+    by ID, or a value is not text (numbers are converted).
+    '''
+
+    if isinstance(data, dict):
+        data = [dict(row or {}, id=vulnid) if isinstance(row, dict) or row is None else row
+                for vulnid, row in data.items()]
+    if not isinstance(data, list):
+        raise ValueError(filename + ': template should be a list of rows or rows keyed by ID')
+
+    rows = []
+    for row in data:
+        if not isinstance(row, dict):
+            raise ValueError(filename + ': every template row should be an object')
+        clean = {}
+        for key, value in row.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            elif value is not None and not isinstance(value, str):
+                raise ValueError(filename + ': ' + str(row.get('id', row.get('ID'))) +
+                                 ': ' + str(key) + ' should be text')
+            clean[str(key).replace(' ', '').lower()] = value
+        rows.append(clean)
+    return rows
+
+
+def findinlinecmds(string, cmdtag='<cmd>'):
+    '''
+    Return a list of the tagged commands in string.
+
+    string should be a string
+    cmdtag should be start/end tag to identify commands
+    '''
+
+    # every other substring is a command, same as runinlinecmds()
+    return string.split(cmdtag)[1::2]
+
+
+def runcmd(cmd, timeout=None):
+    '''
+    Return the output of a command.
+
+    cmd should be a command string, it is run directly (not in a shell)
+    timeout should be the timeout in seconds, or None
+
+    Both stdout and stderr output are captured, bytes that are not valid UTF-8
+    are replaced. If the command times out, it is killed and the output
+    captured so far is returned with a note appended.
+    '''
+
+    try:
+        compproc = subprocess.run(shlex.split(
+            cmd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired as err:
+        return str(err.output or b'', encoding='utf-8', errors='replace') + \
+            'genckl: command timed out after ' + str(timeout) + ' seconds\n'
+    return str(compproc.stdout, encoding='utf-8', errors='replace')
+
+
+@stats.timed('commands')
+def runcmds(cmds, jobs=4, timeout=None):
+    '''
+    Return a dictionary mapping each command in cmds to its output.
+
+    cmds should be a list of command strings, duplicates are run once
+    jobs should be the number of commands run at the same time
+    timeout should be the timeout in seconds for each command, or None
+    '''
+
+    cmds = list(dict.fromkeys(cmds))
+    stats.count('commands_run', len(cmds))
+    with concurrent.futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+        outputs = executor.map(functools.partial(runcmd, timeout=timeout), cmds)
+        return dict(zip(cmds, outputs))
+
+
+def runinlinecmds(string, cmdtag='<cmd>', outputs=None, timeout=None):
     '''
     Returns string with command output in place of tagged commands.
 
@@ -596,6 +2556,10 @@ def runinlinecmds(string, cmdtag='<cmd>'):
     command and is executed. The output of each command replaces the tagged 
     command in the string. Commands are run directly (not in a shell), both
     stdout and stderr output captured.
+
+    outputs may be a dictionary of command output (see runcmds()), commands
+    found in it are not run again, commands that are run are added to it
+    timeout should be the timeout in seconds for each command, or None
     '''
 
     # setup return var
@@ -612,10 +2576,16 @@ def runinlinecmds(string, cmdtag='<cmd>'):
 
         # run command and append output
         if count % 2 == 0:
-            compproc = subprocess.run(shlex.split(
-                s), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            returnstring = returnstring + \
-                str(compproc.stdout, encoding='utf-8')
+            if outputs is None:
+                with stats.phase('commands'):
+                    returnstring = returnstring + runcmd(s, timeout)
+                stats.count('commands_run')
+            else:
+                if s not in outputs:
+                    with stats.phase('commands'):
+                        outputs[s] = runcmd(s, timeout)
+                    stats.count('commands_run')
+                returnstring = returnstring + outputs[s]
 
         # append normal text
         else:
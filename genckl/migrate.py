@@ -0,0 +1,253 @@
+import os
+import pickle
+import multiprocessing
+from . import ckl
+from . import report
+
+# pickled new release Xccdfs, shared read-only by every checklist a worker migrates
+releases = None
+
+# attributes a Vuln is matched on, in order of preference
+MATCH_ATTRS = ['Vuln_Num', 'Rule_Ver', 'LEGACY_ID', 'Group_Title']
+
+# attributes compared to tell if a matched rule changed
+CHANGE_ATTRS = ['Vuln_Num', 'Severity', 'Rule_Title', 'Check_Content',
+                'Fix_Text']
+
+# columns of the migration report
+REPORT_COLUMNS = ['host', 'file', 'stigid', 'change', 'vuln', 'rule_id',
+                  'old_vuln', 'old_rule_id', 'match', 'fields']
+
+
+class VulnIndex():
+    '''
+    This class represents the Vulns of an old STIG release, indexed for matching.
+
+    vulns should be a list of Vuln objects
+
+    Every Vuln is indexed by each of MATCH_ATTRS once, new Vulns are then
+    matched with dictionary lookups. Each old Vuln is matched at most once.
+    '''
+
+    def __init__(self, vulns):
+
+        self.indexes = dict((name, {}) for name in MATCH_ATTRS)
+        self.matched = set()
+        for vuln in vulns:
+            for name in MATCH_ATTRS:
+                for value in matchvalues(vuln, name):
+                    self.indexes[name].setdefault(value, []).append(vuln)
+
+        # the old Vuln_Num was often kept as a LEGACY_ID of the new rule
+        for vuln in vulns:
+            self.indexes['LEGACY_ID'].setdefault(
+                vuln.attrs['Vuln_Num'], []).append(vuln)
+
+    def match(self, vuln):
+        '''
+        Return an (old Vuln, attribute name) tuple for the old Vuln matching
+        vuln, or (None, None).
+
+        Group titles (SRG IDs) are shared by many rules, they are only used
+        when a single old Vuln has the group title.
+        '''
+
+        for name in MATCH_ATTRS:
+            for value in matchvalues(vuln, name):
+                candidates = self.indexes[name].get(value, [])
+                if name == 'Group_Title' and len(candidates) != 1:
+                    continue
+                for candidate in candidates:
+                    if id(candidate) not in self.matched:
+                        self.matched.add(id(candidate))
+                        return candidate, name
+        return None, None
+
+    def unmatched(self, vulns):
+        '''Return the Vulns in vulns that were never matched.'''
+
+        return [vuln for vuln in vulns if id(vuln) not in self.matched]
+
+
+def matchvalues(vuln, name):
+    '''Return the list of values vuln is matched on for attribute name.'''
+
+    if name == 'LEGACY_ID':
+        return vuln.legacy_ids
+    value = vuln.attrs[name]
+    if value:
+        return [value]
+    return []
+
+
+def migratexccdf(old, new):
+    '''
+    Carry the review of an old STIG release forward to a new release.
+
+    old should be the Xccdf of the old release (usually read from a checklist)
+    new should be the Xccdf of the new release, its Vulns are updated
+
+    Status, finding details, comments and severity override are copied from
+    each matching old Vuln. Returns a list of (change, new Vuln, old Vuln,
+    attribute matched on, changed attributes) tuples for rules that are new,
+    changed or removed.
+    '''
+
+    changes = []
+    index = VulnIndex(old.vulns)
+    for vuln in new.vulns:
+        oldvuln, name = index.match(vuln)
+        if oldvuln is None:
+            changes.append(('new', vuln, None, None, []))
+            continue
+
+        vuln.status = oldvuln.status
+        vuln.finding_details = oldvuln.finding_details
+        vuln.comments = oldvuln.comments
+        vuln.severity_override = oldvuln.severity_override
+        vuln.severity_justification = oldvuln.severity_justification
+
+        fields = [field for field in CHANGE_ATTRS
+                  if (vuln.attrs[field] or '') != (oldvuln.attrs[field] or '')]
+        if fields:
+            changes.append(('changed', vuln, oldvuln, name, fields))
+
+    for oldvuln in index.unmatched(old.vulns):
+        changes.append(('removed', None, oldvuln, None, []))
+
+    return changes
+
+
+def migrate(xccdfs, tasks, reportfile, jobs=1):
+    '''
+    Migrate checklists to new STIG releases.
+
+    xccdfs should be a list of parsed new release Xccdf objects
+    tasks should be a list of (old checklist filename, output filename) tuples
+    reportfile should be the csv filename new, changed and removed rules are
+    listed in
+    jobs should be the number of worker processes
+
+    Each STIG in a checklist is replaced by the new release with the same STIG
+    ID, STIGs without a new release are kept as they are. Returns a list of
+    (filename, error message) tuples for checklists that failed.
+    '''
+
+    for xccdf in xccdfs:
+        xccdf.parsedescriptions()
+    blob = pickle.dumps(xccdfs, pickle.HIGHEST_PROTOCOL)
+    table = report.Table(reportfile, REPORT_COLUMNS)
+    failures = []
+
+    def add(result):
+        rows, failure = result
+        for row in rows:
+            table.write(row)
+        if failure:
+            failures.append(failure)
+
+    try:
+        # no pool for a single job, keeps errors and ctrl-c simple
+        if jobs < 2 or len(tasks) < 2:
+            initworker(blob)
+            for result in map(migrateckl, tasks):
+                add(result)
+        else:
+            pool = multiprocessing.Pool(jobs, initworker, (blob,))
+            try:
+                for result in pool.imap(migrateckl, tasks):
+                    add(result)
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+    finally:
+        table.close()
+
+    return failures
+
+
+def initworker(blob):
+    '''Store the pickled new release Xccdfs for migrateckl().'''
+
+    global releases
+    releases = blob
+
+
+def migrateckl(task):
+    '''
+    Migrate a single checklist and write it.
+
+    task should be an (old checklist filename, output filename) tuple
+
+    Returns a (list of report rows, None or (filename, error message)) tuple.
+    '''
+
+    filename, output = task
+    try:
+        old = ckl.readchecklist(filename)
+        new = dict((xccdf.getid(), xccdf) for xccdf in pickle.loads(releases))
+
+        checklist = ckl.Ckl()
+        checklist.asset.update(old.asset)
+        rows = []
+        for oldxccdf in old.xccdfs:
+            xccdf = new.get(oldxccdf.getid())
+            if xccdf is None:
+                checklist.importxccdf(oldxccdf)
+                continue
+            xccdf.newuuids()
+            for change, vuln, oldvuln, name, fields in migratexccdf(oldxccdf, xccdf):
+                rows.append({'host': old.asset['HOST_NAME'], 'file': output,
+                             'stigid': xccdf.getid(), 'change': change,
+                             'vuln': vuln.attrs['Vuln_Num'] if vuln else '',
+                             'rule_id': vuln.attrs['Rule_ID'] if vuln else '',
+                             'old_vuln': oldvuln.attrs['Vuln_Num'] if oldvuln else '',
+                             'old_rule_id': oldvuln.attrs['Rule_ID'] if oldvuln else '',
+                             'match': name or '', 'fields': ' '.join(fields)})
+            checklist.importxccdf(xccdf)
+
+        dirname = os.path.dirname(output)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        checklist.write(output, ckl.getoutputcompression(output),
+                        fmt=ckl.getformat(output))
+
+    # report the failure, other checklists are still migrated
+    except Exception as err:
+        return [], (filename, str(err) or type(err).__name__)
+
+    return rows, None
+
+
+def outputtasks(paths, outdir):
+    '''
+    Return a list of (old checklist filename, output filename) tuples.
+
+    paths should be a list of checklist filenames and directories (see
+    report.findckls()), checklists keep their format and compression,
+    checklists found in a directory keep their path relative to it under
+    outdir
+
+    Raises ValueError if an output filename is the old checklist filename, or
+    is the output filename of another checklist.
+    '''
+
+    tasks = []
+    outputs = {}
+    for path in paths:
+        for filename in report.findckls([path]):
+            if os.path.isdir(path):
+                output = os.path.join(outdir, os.path.relpath(filename, path))
+            else:
+                output = os.path.join(outdir, os.path.basename(filename))
+            if os.path.abspath(output) == os.path.abspath(filename):
+                raise ValueError(filename + ': would be overwritten, use another output directory')
+            key = os.path.normcase(os.path.abspath(output))
+            if key in outputs:
+                raise ValueError(filename + ': output ' + output + ' is used by ' + outputs[key])
+            outputs[key] = filename
+            tasks.append((filename, output))
+    return tasks
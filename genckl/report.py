@@ -0,0 +1,337 @@
+import os
+import csv
+import json
+import multiprocessing
+from xml.etree import ElementTree
+from . import ckl
+
+# checklist statuses and the column their counts are reported in
+STATUS_COLUMNS = [('open', ckl.Vuln.STATUS_OPEN),
+                  ('not_a_finding', ckl.Vuln.STATUS_NOT_A_FINDING),
+                  ('not_applicable', ckl.Vuln.STATUS_NOT_APPLICABLE),
+                  ('not_reviewed', ckl.Vuln.STATUS_NOT_REVIEWED)]
+SEVERITIES = [ckl.Vuln.SEVERITY_CAT_I, ckl.Vuln.SEVERITY_CAT_II,
+              ckl.Vuln.SEVERITY_CAT_III]
+COUNT_COLUMNS = ['vulns'] + [column for column, status in STATUS_COLUMNS]
+
+# checklist filename suffixes searched for in directories, plain or compressed
+CHECKLIST_SUFFIXES = tuple('.' + fmt + compression
+                           for fmt in ckl.FORMATS
+                           for compression in [''] + [values[0] for values
+                                                      in ckl.COMPRESSIONS.values()])
+
+# columns of each report table
+HOST_COLUMNS = ['host', 'file', 'stigs'] + COUNT_COLUMNS + \
+    ['open_' + severity for severity in SEVERITIES]
+STIG_COLUMNS = ['stigid', 'hosts'] + COUNT_COLUMNS
+VULN_COLUMNS = ['stigid', 'vuln', 'severity', 'hosts'] + COUNT_COLUMNS[1:]
+CCI_COLUMNS = ['cci'] + COUNT_COLUMNS
+
+
+class Table():
+    '''
+    This class represents a report table written one row at a time.
+
+    filename should be the output filename
+    columns should be a list of column names
+    fmt should be "csv" or "json" (a list of objects)
+    '''
+
+    def __init__(self, filename, columns, fmt='csv'):
+
+        self.columns = columns
+        self.fmt = fmt
+        self.rows = 0
+        self.file = open(filename, 'w', newline='', encoding='UTF-8')
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(
+                self.file, columns, extrasaction='ignore')
+            self.writer.writeheader()
+        else:
+            self.file.write('[')
+
+    def write(self, row):
+        '''Write a row, row should be a dictionary keyed by column name.'''
+
+        if self.fmt == 'csv':
+            self.writer.writerow(row)
+        else:
+            if self.rows:
+                self.file.write(',')
+            self.file.write('\n' + json.dumps(
+                dict((column, row[column]) for column in self.columns)))
+        self.rows = self.rows + 1
+
+    def close(self):
+
+        if self.fmt == 'json':
+            self.file.write('\n]\n')
+        self.file.close()
+
+
+class FleetReport():
+    '''
+    This class represents compliance counts across many checklists.
+
+    outdir should be the directory the report tables are written to
+    fmt should be "csv" or "json"
+
+    Host rows are written as each checklist is added, only the per STIG, per
+    vuln and per CCI counts are kept in memory, so memory use depends on the
+    number of distinct rules, not on the number of checklists.
+    '''
+
+    def __init__(self, outdir, fmt='csv'):
+
+        self.outdir = outdir
+        self.fmt = fmt
+        self.stigs = {}
+        self.vulns = {}
+        self.ccis = {}
+        os.makedirs(outdir, exist_ok=True)
+        self.hosts = Table(self.path('hosts'), HOST_COLUMNS, fmt)
+
+    def path(self, name):
+        '''Return the filename of the report table name.'''
+
+        return os.path.join(self.outdir, name + '.' + self.fmt)
+
+    def add(self, summary):
+        '''
+        Add a checklist summary to the report.
+
+        summary should be a dictionary returned by summarize()
+        '''
+
+        host = newcounts()
+        host.update({'host': summary['host'], 'file': summary['file'],
+                     'stigs': len(set(vuln[0] for vuln in summary['vulns']))})
+        for severity in SEVERITIES:
+            host['open_' + severity] = 0
+
+        seen = set()
+        for stigid, vulnnum, rulesev, severity, status, ccis in summary['vulns']:
+            column = statuscolumn(status)
+            addcount(host, column)
+            if status == ckl.Vuln.STATUS_OPEN and severity in SEVERITIES:
+                host['open_' + severity] = host['open_' + severity] + 1
+
+            # count each host once per stig
+            stig = self.stigs.get(stigid)
+            if stig is None:
+                stig = self.stigs[stigid] = newcounts()
+                stig['hosts'] = 0
+            if stigid not in seen:
+                seen.add(stigid)
+                stig['hosts'] = stig['hosts'] + 1
+            addcount(stig, column)
+
+            # the rule's own severity, a host's severity override is not
+            # the severity of the rule for the whole fleet
+            vuln = self.vulns.get((stigid, vulnnum))
+            if vuln is None:
+                vuln = self.vulns[(stigid, vulnnum)] = newcounts()
+                vuln['severity'] = rulesev
+                vuln['hosts'] = 0
+            vuln['hosts'] = vuln['hosts'] + 1
+            addcount(vuln, column)
+
+            for cci in ccis:
+                if cci not in self.ccis:
+                    self.ccis[cci] = newcounts()
+                addcount(self.ccis[cci], column)
+
+        self.hosts.write(host)
+
+    def close(self):
+        '''Write the per STIG, per vuln and per CCI tables, sorted.'''
+
+        self.hosts.close()
+
+        table = Table(self.path('stigs'), STIG_COLUMNS, self.fmt)
+        for stigid in sorted(self.stigs):
+            table.write(dict(self.stigs[stigid], stigid=stigid))
+        table.close()
+
+        table = Table(self.path('vulns'), VULN_COLUMNS, self.fmt)
+        for stigid, vulnnum in sorted(self.vulns):
+            table.write(dict(self.vulns[(stigid, vulnnum)], stigid=stigid,
+                             vuln=vulnnum))
+        table.close()
+
+        table = Table(self.path('ccis'), CCI_COLUMNS, self.fmt)
+        for cci in sorted(self.ccis):
+            table.write(dict(self.ccis[cci], cci=cci))
+        table.close()
+
+
+def findckls(paths):
+    '''
+    Yield every ckl filename in paths, in sorted order.
+
+    paths should be a list of checklist filenames and directories, directories
+    are searched recursively for ckl and cklb files, plain or compressed (see
+    CHECKLIST_SUFFIXES)
+    '''
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(CHECKLIST_SUFFIXES):
+                    yield os.path.join(dirpath, filename)
+
+
+def summarize(filename):
+    '''
+    Return a summary of the checklist filename.
+
+    Returns a dictionary with the following keys:
+     - file: filename
+     - host: HOST_NAME, or the filename without suffixes if not set
+     - vulns: list of (stigid, Vuln_Num, rule severity, severity, status,
+       CCI_REFs) tuples, the severity is the severity override if there is
+       one, the rule severity otherwise
+     - error: error message if the checklist could not be read, else None
+
+    Only the elements of a ckl needed are looked at, each VULN is dropped once
+    read. A cklb is read whole (see ckl.readcklb()). Any error reading the
+    checklist is reported in the summary, one bad file never ends a report.
+    '''
+
+    summary = {'file': filename, 'host': '', 'vulns': [], 'error': None}
+    try:
+        f, fmt = ckl.openchecklist(filename)
+        if fmt == 'cklb':
+            summarizecklb(summary, ckl.readcklb(f))
+        else:
+            with f:
+                summarizeckl(summary, f)
+
+    # malformed checklists fail in many ways (a cklb of wrong json types
+    # raises TypeError or AttributeError), all of them are per file errors
+    except Exception as err:
+        summary['host'] = ''
+        summary['vulns'] = []
+        summary['error'] = str(err) or type(err).__name__
+
+    if not summary['host']:
+        summary['host'] = checklistname(filename)
+    return summary
+
+
+def checklistname(filename):
+    '''Return the base name of a checklist filename without its suffixes.'''
+
+    name = os.path.basename(filename)
+    for suffix in CHECKLIST_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def summarizeckl(summary, source):
+    '''Add the host name and vulns of the ckl read from source to summary.'''
+
+    stigid = ''
+    for event, elem in ElementTree.iterparse(source):
+        if elem.tag == 'VULN':
+            attrs = {}
+            ccis = []
+            for stig_data_el in elem.iterfind('STIG_DATA'):
+                name = stig_data_el.findtext('VULN_ATTRIBUTE')
+                if name == 'CCI_REF':
+                    ccis.append(stig_data_el.findtext('ATTRIBUTE_DATA'))
+                elif name == 'Vuln_Num' or name == 'Severity':
+                    attrs[name] = stig_data_el.findtext('ATTRIBUTE_DATA')
+            rulesev = attrs.get('Severity') or ''
+            severity = elem.findtext('SEVERITY_OVERRIDE') or rulesev
+            status = elem.findtext('STATUS') or ckl.Vuln.STATUS_NOT_REVIEWED
+            summary['vulns'].append((stigid, attrs.get('Vuln_Num') or '',
+                                     rulesev, severity, status, tuple(ccis)))
+            elem.clear()
+        elif elem.tag == 'SI_DATA' and elem.findtext('SID_NAME') == 'stigid':
+            stigid = elem.findtext('SID_DATA') or ''
+        elif elem.tag == 'HOST_NAME':
+            summary['host'] = elem.text or ''
+        elif elem.tag == 'iSTIG':
+            elem.clear()
+
+
+def summarizecklb(summary, checklist):
+    '''Add the host name and vulns of the Ckl checklist (from a cklb) to summary.'''
+
+    summary['host'] = checklist.asset['HOST_NAME']
+    for xccdf in checklist.xccdfs:
+        for vuln in xccdf.vulns:
+            rulesev = vuln.attrs['Severity'] or ''
+            summary['vulns'].append((xccdf.getid(), vuln.attrs['Vuln_Num'] or '',
+                                     rulesev, vuln.severity_override or rulesev,
+                                     vuln.status, tuple(vuln.cci_refs)))
+
+
+def generate(paths, outdir, fmt='csv', jobs=1):
+    '''
+    Write a compliance report for every checklist found in paths.
+
+    paths should be a list of ckl filenames and directories (see findckls())
+    outdir should be the directory report tables are written to
+    fmt should be "csv" or "json"
+    jobs should be the number of worker processes reading checklists
+
+    Writes the tables hosts, stigs, vulns and ccis. Returns a list of
+    (filename, error message) tuples for checklists that could not be read.
+    '''
+
+    report = FleetReport(outdir, fmt)
+    failures = []
+
+    def add(summary):
+        if summary['error']:
+            failures.append((summary['file'], summary['error']))
+        else:
+            report.add(summary)
+
+    # no pool for a single job, keeps errors and ctrl-c simple
+    if jobs < 2:
+        for summary in map(summarize, findckls(paths)):
+            add(summary)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for summary in pool.imap(summarize, findckls(paths), chunksize=8):
+                add(summary)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    report.close()
+    return failures
+
+
+def newcounts():
+    '''Return a dictionary of zeroed vuln and status counts.'''
+
+    return dict.fromkeys(COUNT_COLUMNS, 0)
+
+
+def addcount(counts, column):
+    '''Count a vuln with the status column in counts.'''
+
+    counts['vulns'] = counts['vulns'] + 1
+    counts[column] = counts[column] + 1
+
+
+def statuscolumn(status):
+    '''Return the report column for a checklist status.'''
+
+    for column, value in STATUS_COLUMNS:
+        if status == value:
+            return column
+    return 'not_reviewed'
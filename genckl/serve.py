@@ -0,0 +1,276 @@
+import os
+import io
+import sys
+import json
+import stat
+import pickle
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import collections
+import socketserver
+from . import ckl
+from .cache import filedigest, loadtemplatelayers
+
+
+class XccdfMemory():
+    '''
+    This class represents an in-memory LRU of parsed benchmark Xccdfs.
+
+    maxsize should be the maximum total size of pickled entries in bytes
+    cache may be an XccdfCache object used when a file has to be parsed
+    stream is passed on to Xccdf when a file has to be parsed
+
+    Entries are keyed by filename (and zip selection). A file is parsed again
+    when its mtime or size changed and its SHA-256 hash differs. Files with
+    results are never kept, they usually differ from request to request.
+    '''
+
+    def __init__(self, maxsize=512*1024*1024, cache=None, stream=False):
+
+        self.maxsize = maxsize
+        self.cache = cache
+        self.stream = stream
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def load(self, filename, select=None):
+        '''
+        Return a list of Xccdf objects for an xccdf filename or STIG zip filename.
+
+        select is passed on to loadfile()
+
+        Every call returns new Xccdf objects with new uuids, they can be
+        changed freely.
+        '''
+
+        filename = os.path.abspath(filename)
+        key = (filename, tuple(select or ()))
+        st = os.stat(filename)
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        # unchanged, or touched without changing the content
+        if entry is not None:
+            if entry['signature'] == signature:
+                return unpickle(entry['blob'])
+            if entry['digest'] == filedigest(filename):
+                entry['signature'] = signature
+                return unpickle(entry['blob'])
+
+        # parse, keep a pickled copy of files without results
+        digest = filedigest(filename)
+        xccdfs = ckl.loadfile(filename, self.stream, self.cache, select)
+        for xccdf in xccdfs:
+            if xccdf.hasresults:
+                return xccdfs
+            xccdf.parsedescriptions()
+        blob = pickle.dumps(xccdfs, pickle.HIGHEST_PROTOCOL)
+        self.put(key, {'signature': signature, 'digest': digest, 'blob': blob})
+        return xccdfs
+
+    def put(self, key, entry):
+        '''Store entry under key, then evict the least recently used entries.'''
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size = self.size - len(old['blob'])
+            self.entries[key] = entry
+            self.size = self.size + len(entry['blob'])
+
+            # always keep the newest entry, even if it is over maxsize
+            while self.size > self.maxsize and len(self.entries) > 1:
+                oldkey, old = self.entries.popitem(last=False)
+                self.size = self.size - len(old['blob'])
+
+
+class Handler(socketserver.StreamRequestHandler):
+    '''
+    This class handles a single checklist request.
+
+    A request is a line of json (see connect()), the response is a line of
+    json holding an "error" message or null, followed by the checklist. The
+    checklist is written to a temporary file before the response is sent, so
+    an error while writing it is reported instead of a truncated checklist.
+    '''
+
+    def handle(self):
+
+        with tempfile.TemporaryFile() as spool:
+            try:
+                request = json.loads(self.rfile.readline().decode('UTF-8'))
+                checklist = buildchecklist(request, self.server.memory)
+                checklist.write(UnclosedTextIOWrapper(spool, encoding='UTF-8'),
+                                fmt=request.get('format') or 'ckl')
+            except Exception as err:
+                message = str(err) or type(err).__name__
+                print('genckl: ' + message, file=sys.stderr)
+                self.wfile.write(
+                    (json.dumps({'error': message}) + '\n').encode('UTF-8'))
+                return
+
+            # a client that went away needs no response
+            spool.seek(0)
+            try:
+                self.wfile.write((json.dumps({'error': None}) + '\n').encode('UTF-8'))
+                shutil.copyfileobj(spool, self.wfile)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class UnclosedTextIOWrapper(io.TextIOWrapper):
+    '''TextIOWrapper leaving its binary file open when closed by Ckl.write().'''
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''
+    This class represents a genckl server listening on a Unix domain socket.
+
+    path should be the socket filename
+    memory should be the XccdfMemory shared by all requests
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, path, memory):
+
+        self.memory = memory
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+
+
+def serve(path, memory):
+    '''
+    Serve checklist requests on the Unix domain socket path until interrupted.
+
+    memory should be an XccdfMemory object
+
+    The socket is only accessible by the current user, template commands are
+    run as that user. A stale socket left by a server that died is replaced.
+    '''
+
+    removestale(path)
+    umask = os.umask(0o177)
+    try:
+        server = Server(path, memory)
+    finally:
+        os.umask(umask)
+
+    # exit cleanly on SIGTERM too, so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def removestale(path):
+    '''Remove the socket path if no server is listening on it.'''
+
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError(path + ': exists and is not a socket')
+    except FileNotFoundError:
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise OSError(path + ': a server is already listening')
+
+
+def buildchecklist(request, memory):
+    '''
+    Return a Ckl built as requested.
+
+    request should be a dictionary (see connect())
+    memory should be an XccdfMemory object
+    '''
+
+    if not isinstance(request, dict) or not request.get('inputs'):
+        raise ValueError('request needs a list of inputs')
+    if (request.get('format') or 'ckl') not in ckl.FORMATS:
+        raise ValueError('unknown checklist format ' + str(request['format']))
+
+    checklist = ckl.Ckl()
+    for filename in request['inputs']:
+        for xccdf in memory.load(filename, request.get('select')):
+            checklist.importxccdf(xccdf)
+
+    templates = request.get('templates') or []
+    templatedirs = request.get('template_dirs') or []
+    runcmds = request.get('run_commands', False)
+    timeout = request.get('command_timeout')
+    if templates or templatedirs:
+        template = loadtemplatelayers(templatedirs, templates, memory.cache)
+        if runcmds:
+            checklist.runtemplatecmds(
+                [template], request.get('command_jobs', 4), timeout)
+        checklist.addtemplate(template, runcmds, timeout)
+
+    if request.get('set_hostdata'):
+        checklist.sethostdata()
+
+    return checklist
+
+
+def connect(path, request, output, compression=None, level=None):
+    '''
+    Send a checklist request to the genckl server at path, write the checklist.
+
+    request should be a dictionary with the following keys (only "inputs" is
+    required), filenames should be absolute:
+     - inputs: list of xccdf filenames or STIG zip filenames
+     - templates: list of checklist template filenames
+     - template_dirs: list of checklist template directories
+     - select: list of glob patterns (see iterstigzip())
+     - run_commands, set_hostdata: booleans
+     - command_jobs, command_timeout: see runtemplatecmds()
+     - format: checklist format, "ckl" (default) or "cklb"
+    output should be a filename or a binary file object, it is only opened if
+    the request succeeded
+    compression and level are passed on to ckl.openoutput(), the checklist is
+    compressed as it is received
+
+    Raises ValueError with the server's message if the request failed.
+    '''
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(request) + '\n').encode('UTF-8'))
+        response = sock.makefile('rb')
+
+        header = response.readline()
+        if not header:
+            raise ValueError('server closed the connection')
+        error = json.loads(header.decode('UTF-8'))['error']
+        if error:
+            raise ValueError(error)
+
+        output_file = ckl.openoutput(output, compression, level, binary=True)
+        with output_file:
+            shutil.copyfileobj(response, output_file)
+
+
+def unpickle(blob):
+    '''Return the Xccdfs pickled in blob, with new uuids.'''
+
+    xccdfs = pickle.loads(blob)
+    for xccdf in xccdfs:
+        xccdf.newuuids()
+    return xccdfs
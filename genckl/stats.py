@@ -0,0 +1,189 @@
+import os
+import time
+import json
+import functools
+import threading
+from . import __version__
+
+# nothing is collected until enable() is called, the hooks are no-ops until then
+enabled = False
+started = None
+phases = {}
+counters = {}
+
+# names of the phases being timed by each thread
+active = threading.local()
+
+
+class Timer():
+    '''
+    This class represents a block of code timed as part of a phase.
+
+    name should be the phase name
+
+    Use as a context manager, the wall and CPU time spent in the block are
+    added to the phase when it exits. A block entered while the same thread is
+    already timing the phase (e.g. a timed function calling another one timed
+    as the same phase) is not timed again, so it is not counted twice.
+    '''
+
+    def __init__(self, name):
+
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+
+        if enabled:
+            names = activephases()
+            if self.name not in names:
+                names.add(self.name)
+                self.start = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, *exc_info):
+
+        if self.start is not None:
+            activephases().discard(self.name)
+            if enabled:
+                addphase(self.name, time.perf_counter() - self.start[0],
+                         time.process_time() - self.start[1])
+            self.start = None
+        return False
+
+
+class CountingWriter():
+    '''
+    This class represents a text file object counting the bytes written to it.
+
+    output_file should be an open text file object
+    name should be the counter the UTF-8 encoded size is added to on close
+    '''
+
+    def __init__(self, output_file, name):
+
+        self.output_file = output_file
+        self.name = name
+        self.size = 0
+
+    def write(self, text):
+
+        self.size = self.size + len(text.encode('UTF-8'))
+        return self.output_file.write(text)
+
+    def close(self):
+
+        count(self.name, self.size)
+        self.output_file.close()
+
+
+def enable():
+    '''Start collecting phase timings and counters, clearing previous ones.'''
+
+    global enabled, started
+    reset()
+    # a forked worker starts with the phases its parent was timing
+    activephases().clear()
+    enabled = True
+    started = (time.perf_counter(), cputime())
+
+
+def reset():
+    '''Clear the collected phase timings and counters.'''
+
+    phases.clear()
+    counters.clear()
+
+
+def phase(name):
+    '''Return a Timer for the phase name.'''
+
+    return Timer(name)
+
+
+def timed(name):
+    '''Return a decorator timing every call of a function as the phase name.'''
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Timer(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def activephases():
+    '''Return the set of phase names the current thread is timing.'''
+
+    names = getattr(active, 'names', None)
+    if names is None:
+        names = active.names = set()
+    return names
+
+
+def addphase(name, wall, cpu, calls=1):
+    '''Add wall and CPU seconds and a number of calls to the phase name.'''
+
+    totals = phases.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+    totals['calls'] = totals['calls'] + calls
+    totals['wall'] = totals['wall'] + wall
+    totals['cpu'] = totals['cpu'] + cpu
+
+
+def count(name, amount=1):
+    '''Add amount to the counter name.'''
+
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def snapshot():
+    '''Return a copy of the collected phase timings and counters.'''
+
+    return {'phases': dict((name, dict(totals)) for name, totals in phases.items()),
+            'counters': dict(counters)}
+
+
+def merge(stats):
+    '''Add the phase timings and counters of a snapshot(), e.g. from a worker.'''
+
+    for name, totals in stats['phases'].items():
+        addphase(name, totals['wall'], totals['cpu'], totals['calls'])
+    for name, amount in stats['counters'].items():
+        count(name, amount)
+
+
+def report():
+    '''
+    Return a dictionary of everything collected since enable().
+
+    The total CPU time includes child processes (parse workers, template
+    commands) that have finished.
+    '''
+
+    result = snapshot()
+    result['version'] = __version__
+    result['wall'] = time.perf_counter() - started[0]
+    result['cpu'] = cputime() - started[1]
+    return result
+
+
+def dump(filename):
+    '''Write report() to filename as JSON.'''
+
+    with open(filename, 'w') as f:
+        json.dump(report(), f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def cputime():
+    '''Return the CPU time used by this process and its finished children.'''
+
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
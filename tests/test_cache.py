@@ -0,0 +1,73 @@
+'''
+Tests for the on-disk STIG cache.
+
+Run from the top of the source tree:
+
+    python -m unittest discover tests
+'''
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from genckl import cache  # noqa: E402
+import synth  # noqa: E402
+
+
+@unittest.skipIf(not hasattr(os, 'getuid'), 'no user ids to check')
+class XccdfCacheTest(unittest.TestCase):
+
+    def setUp(self):
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = os.path.join(tmpdir.name, 'cache')
+        self.xml = synth.benchmark(3, 'STIG_T')
+
+    def entries(self):
+        '''Return the paths of the cache entries.'''
+
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith('.pickle')]
+
+    def test_private_directory(self):
+        xccdfcache = cache.XccdfCache(self.directory)
+
+        self.assertTrue(xccdfcache.private)
+        self.assertEqual(os.stat(self.directory).st_mode & 0o777, 0o700)
+        xccdfcache.load(self.source())
+        self.assertEqual(len(self.entries()), 1)
+        self.assertIsNotNone(xccdfcache.get(self.entries()[0]))
+
+    def test_shared_directory(self):
+        os.makedirs(self.directory)
+        os.chmod(self.directory, 0o777)
+        xccdfcache = cache.XccdfCache(self.directory)
+
+        self.assertFalse(xccdfcache.private)
+        xccdfcache.load(self.source())
+        self.assertEqual(self.entries(), [])
+
+    def test_shared_entry(self):
+        xccdfcache = cache.XccdfCache(self.directory)
+        xccdfcache.load(self.source())
+        path = self.entries()[0]
+        os.chmod(path, 0o666)
+
+        self.assertIsNone(xccdfcache.get(path))
+
+    def source(self):
+        '''Return the test STIG as a file object.'''
+
+        source = io.StringIO(self.xml)
+        source.name = 'stig-xccdf.xml'
+        return source
+
+
+if __name__ == '__main__':
+    unittest.main()
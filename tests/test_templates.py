@@ -0,0 +1,148 @@
+'''
+Tests for reading, compiling and applying checklist templates.
+
+Run from the top of the source tree:
+
+    python -m unittest discover tests
+'''
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import genckl  # noqa: E402
+from genckl import ckl  # noqa: E402
+import synth  # noqa: E402
+
+
+class TemplateTest(unittest.TestCase):
+
+    def setUp(self):
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def writefile(self, name, content):
+        '''Write content to name in the test directory, return its path.'''
+
+        return synth.writefile(os.path.join(self.tmpdir, name), content)
+
+    def newckl(self):
+        '''Return a Ckl of a small synthetic STIG.'''
+
+        source = io.StringIO(synth.benchmark(3, 'STIG_T'))
+        source.name = 'stig-xccdf.xml'
+        checklist = ckl.Ckl()
+        checklist.importxccdf(ckl.Xccdf(source))
+        return checklist
+
+    def compile(self, *templates):
+        '''Run compile-template, return its exit status and error output.'''
+
+        output = os.path.join(self.tmpdir, 'compiled.cklt')
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            genckl.runcompiletemplate(['-o', output] + list(templates))
+            status = 0
+        except SystemExit as err:
+            status = err.code
+        finally:
+            errors = sys.stderr.getvalue()
+            sys.stderr = stderr
+        return status, errors
+
+    def test_empty_command_output(self):
+        checklist = self.newckl()
+        vuln = checklist.getvulnsbyid(synth.vulnid(0))[0]
+        vuln.finding_details = 'Tool: synth 1.0 Result: fail'
+        template = self.writefile('template.csv', 'ID,Finding Details\n' +
+                                  synth.vulnid(0) + ',<cmd>' + sys.executable + ' -c pass<cmd>\n')
+
+        checklist.addtemplate(template, runcmds=True)
+        self.assertEqual(vuln.finding_details, '')
+
+    def test_empty_value_kept(self):
+        checklist = self.newckl()
+        vuln = checklist.getvulnsbyid(synth.vulnid(0))[0]
+        vuln.finding_details = 'Tool: synth 1.0 Result: fail'
+        template = self.writefile('template.csv', 'ID,Status,Finding Details\n' +
+                                  synth.vulnid(0) + ',Open,\n')
+
+        checklist.addtemplate(template, runcmds=True)
+        self.assertEqual(vuln.finding_details, 'Tool: synth 1.0 Result: fail')
+        self.assertEqual(vuln.status, ckl.Vuln.STATUS_OPEN)
+
+    @unittest.skipIf(ckl.yaml is None, 'PyYAML is not installed')
+    def test_malformed_yaml(self):
+        template = self.writefile('template.yaml', 'V-000000: {status: [open\n')
+
+        with self.assertRaises(ValueError):
+            ckl.loadtemplate(template)
+        status, errors = self.compile(template)
+        self.assertEqual(status, 1)
+        self.assertIn('template.yaml', errors)
+        self.assertNotIn('Traceback', errors)
+
+    def test_malformed_json(self):
+        template = self.writefile('template.json', '{"V-000000": ')
+
+        with self.assertRaises(ValueError):
+            ckl.loadtemplate(template)
+
+    def test_empty_csv(self):
+        template = self.writefile('template.csv', '')
+
+        self.assertEqual(ckl.loadtemplate(template).rows, {})
+        status, errors = self.compile(template)
+        self.assertEqual(status, 1)
+        self.assertIn('no ID column', errors)
+
+    def test_no_id_column(self):
+        template = self.writefile('template.csv', 'Rule,Status\nSV-000000r1_rule,Open\n')
+
+        self.assertEqual(ckl.loadtemplate(template).rows, {})
+        with self.assertRaises(ValueError):
+            ckl.loadtemplate(template, strict=True)
+        status, errors = self.compile(template)
+        self.assertEqual(status, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'compiled.cklt')))
+
+    def test_compiled_round_trip(self):
+        template = self.writefile('template.csv', 'ID,Status,Severity Override\n' +
+                                  synth.vulnid(0) + ',Not A Finding,CAT III\n')
+
+        status, errors = self.compile(template)
+        self.assertEqual(status, 0, errors)
+        compiled = ckl.loadtemplate(os.path.join(self.tmpdir, 'compiled.cklt'))
+        self.assertEqual(compiled.rows, ckl.loadtemplate(template).rows)
+
+    def writecompiled(self, values):
+        '''Write a compiled template with one row of values, return its path.'''
+
+        data = {'format': ckl.Template.FORMAT, 'sources': ['template.csv'],
+                'rows': {synth.vulnid(0): values}}
+        return self.writefile('compiled.cklt', ckl.Template.MAGIC.decode() + json.dumps(data))
+
+    def test_compiled_unknown_status(self):
+        template = self.writecompiled(['Bogus', None, None, None, None])
+
+        with self.assertRaises(ValueError):
+            ckl.loadtemplate(template)
+
+    def test_compiled_unknown_severity(self):
+        template = self.writecompiled([None, None, None, 'severe', None])
+
+        with self.assertRaises(ValueError):
+            ckl.loadtemplate(template)
+
+
+if __name__ == '__main__':
+    unittest.main()